@@ -1,3 +1,5 @@
 from ._version import get_versions
 __version__ = get_versions()['version']
 del get_versions
+
+from ._index import MetadataIndex
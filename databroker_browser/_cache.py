@@ -0,0 +1,115 @@
+from collections import OrderedDict
+import sys
+import threading
+
+import numpy as np
+
+
+def approx_sizeof(obj):
+    """
+    Estimate the memory held by a (possibly nested) document, in bytes.
+
+    This follows dicts, lists and tuples and counts the buffers of numpy
+    arrays. It is an estimate meant for cache budgets, not an exact account.
+    """
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) + obj.nbytes
+    size = sys.getsizeof(obj)
+    if hasattr(obj, 'items'):
+        for key, val in obj.items():
+            size += approx_sizeof(key) + approx_sizeof(val)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for val in obj:
+            size += approx_sizeof(val)
+    return size
+
+
+class LRUCache:
+    """
+    A mapping that discards the least recently used items beyond a budget.
+
+    Getting or setting an item marks it as most recently used. Sizes are
+    measured when an item is set; set it again to re-measure an item that
+    has grown.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        maximum number of items. None (default) means no limit.
+    max_bytes : int, optional
+        maximum total size of the items, as measured by ``sizeof``. None
+        (default) means no limit.
+    sizeof : callable, optional
+        expected signature: ``f(value) -> int``. Default is ``approx_sizeof``.
+    """
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=approx_sizeof):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._data = OrderedDict()  # maps key -> (value, size)
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            value, size = self._data[key]
+            self._data.move_to_end(key)
+            return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self.nbytes += size
+            self._evict()
+
+    def __delitem__(self, key):
+        with self._lock:
+            self.nbytes -= self._data.pop(key)[1]
+
+    def pop(self, key, *default):
+        with self._lock:
+            if key not in self._data:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            value, size = self._data.pop(key)
+            self.nbytes -= size
+            return value
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    def values(self):
+        "Return the values, oldest first, without marking them as used."
+        with self._lock:
+            return [value for value, size in self._data.values()]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def _evict(self):
+        # Always keep the newest item, even if it alone exceeds the budget.
+        while len(self._data) > 1 and (
+                (self.max_entries is not None and
+                 len(self._data) > self.max_entries) or
+                (self.max_bytes is not None and
+                 self.nbytes > self.max_bytes)):
+            key, (value, size) = self._data.popitem(last=False)
+            self.nbytes -= size
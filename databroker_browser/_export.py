@@ -0,0 +1,818 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+import json
+import os
+
+import numpy as np
+
+
+# Rows per chunk: large enough for pandas' writers to run at full speed,
+# small enough that a chunk of scalar fields takes a few MB.
+CHUNK_SIZE = 10000
+
+# Rows holding arrays (e.g., filled images) are chunked to about this size.
+CHUNK_BYTES = 64 * 2**20
+
+
+def stream_names(header):
+    "List the names of a run's event streams, in the order first described."
+    return list(OrderedDict.fromkeys(d.get('name', 'primary')
+                                     for d in header.descriptors))
+
+
+def stream_fields(header, stream_name, fields=None):
+    """
+    List the data keys of one event stream, sorted.
+
+    Parameters
+    ----------
+    header : Header
+    stream_name : str
+    fields : iterable, optional
+        If given, only these fields are listed.
+
+    Returns
+    -------
+    keys : list
+    """
+    keys = set(_data_keys(header, stream_name))
+    if fields is not None:
+        keys.intersection_update(fields)
+    return sorted(keys)
+
+
+def _data_keys(header, stream_name):
+    "Merge the data_keys of the descriptors of one stream."
+    data_keys = {}
+    for descriptor in header.descriptors:
+        if descriptor.get('name', 'primary') == stream_name:
+            data_keys.update(descriptor['data_keys'])
+    return data_keys
+
+
+def _table(events, keys, convert_times):
+    import pandas as pd
+    columns = {'time': [ev['time'] for ev in events]}
+    for key in keys:
+        columns[key] = [ev['data'].get(key) for ev in events]
+    index = pd.Index([ev['seq_num'] for ev in events], name='seq_num')
+    df = pd.DataFrame(columns, index=index)
+    if convert_times:
+        local = datetime.now(timezone.utc).astimezone().tzinfo
+        df['time'] = pd.to_datetime(df['time'], unit='s',
+                                    utc=True).dt.tz_convert(local)
+    return df
+
+
+def iter_tables(db, header, stream_name, chunk_size=CHUNK_SIZE, fields=None,
+                fill=False, convert_times=True):
+    """
+    Yield the events of one stream as tables of at most chunk_size rows.
+
+    Each table is a pandas DataFrame laid out like ``db.get_table``'s: it is
+    indexed by seq_num and has a time column and a column per field. Every
+    table has the same columns, so they can be written one after another.
+    Only one chunk of events is held in memory at a time; chunks of events
+    holding arrays are made shorter, to about ``CHUNK_BYTES``.
+
+    Parameters
+    ----------
+    db : Broker
+    header : Header
+    stream_name : str
+    chunk_size : int, optional
+        Default is ``CHUNK_SIZE``.
+    fields : iterable, optional
+        fields to include. Default is all of them.
+    fill : bool, optional
+        whether to load externally stored data. Default is False, which
+        gives references to it, as ``db.get_table`` does.
+    convert_times : bool, optional
+        whether to convert times from seconds since 1970 to datetimes in the
+        local timezone. Default is True.
+
+    Yields
+    ------
+    table : DataFrame
+    """
+    for keys, chunk in _iter_event_chunks(db, header, stream_name, chunk_size,
+                                          fields, fill):
+        yield _table(chunk, keys, convert_times)
+
+
+def _chunk_rows(header, stream_name, keys, chunk_size, fill):
+    "Reduce chunk_size so that a chunk takes about CHUNK_BYTES or less."
+    data_keys = _data_keys(header, stream_name)
+    row_bytes = 0
+    for key in keys:
+        data_key = data_keys.get(key, {})
+        if 'external' in data_key and not fill:
+            row_bytes += 8  # a reference to the data
+        else:
+            # Assume 8-byte elements; the descriptor does not say.
+            row_bytes += 8 * int(np.prod(data_key.get('shape') or []))
+    return max(1, min(chunk_size, CHUNK_BYTES // max(row_bytes, 1)))
+
+
+def _iter_event_chunks(db, header, stream_name, chunk_size, fields, fill):
+    "Yield (data keys, list of at most chunk_size events)."
+    keys = stream_fields(header, stream_name, fields)
+    chunk_size = _chunk_rows(header, stream_name, keys, chunk_size, fill)
+    events = iter(db.get_events(header, stream_name=stream_name,
+                                fields=fields, fill=fill))
+    while True:
+        chunk = list(islice(events, chunk_size))
+        if not chunk:
+            return
+        if not keys and fields is None:
+            # no descriptor to list the fields; use the data
+            keys = sorted(chunk[0]['data'])
+        yield keys, chunk
+
+
+def _column(values):
+    "Make an array of one field's values, with array values stacked as rows."
+    try:
+        return np.asarray(values)
+    except ValueError:  # arrays of differing shapes
+        column = np.empty(len(values), dtype=object)
+        column[:] = values
+        return column
+
+
+def iter_columns(db, header, stream_name, chunk_size=CHUNK_SIZE, fields=None,
+                 fill=False):
+    """
+    Yield the events of one stream as numpy columns of at most chunk_size rows.
+
+    Each chunk is an OrderedDict mapping 'seq_num', 'time' (seconds since
+    1970) and each field to an array with one row per event. The rows of an
+    array-valued field are its values, so a field of 2x3 arrays gives an
+    array of shape (n, 2, 3). Only one chunk of events is held in memory at a
+    time, sized as in ``iter_tables``.
+
+    Parameters
+    ----------
+    db : Broker
+    header : Header
+    stream_name : str
+    chunk_size : int, optional
+        Default is ``CHUNK_SIZE``.
+    fields : iterable, optional
+        fields to include. Default is all of them.
+    fill : bool, optional
+        whether to load externally stored data. Default is False, which
+        gives references to it, as ``db.get_table`` does.
+
+    Yields
+    ------
+    columns : OrderedDict
+    """
+    data_keys = _data_keys(header, stream_name)
+    for keys, chunk in _iter_event_chunks(db, header, stream_name, chunk_size,
+                                          fields, fill):
+        columns = OrderedDict()
+        columns['seq_num'] = np.array([ev['seq_num'] for ev in chunk])
+        columns['time'] = np.array([ev['time'] for ev in chunk], dtype=float)
+        for key in keys:
+            column = _column([ev['data'].get(key) for ev in chunk])
+            if (data_keys.get(key, {}).get('dtype') == 'number' and
+                    column.dtype.kind in 'iu'):
+                # A 'number' may hold whole values in one chunk and not in
+                # the next. Keep every chunk the same type.
+                column = column.astype(float)
+            columns[key] = column
+        yield columns
+
+
+def write_csv(db, header, stream_name, fp, chunk_size=CHUNK_SIZE,
+              progress=None, cancel=None, **kwargs):
+    """
+    Write the events of one stream to a CSV file, a chunk at a time.
+
+    Memory use is bounded by the size of a chunk (see ``iter_tables``), not
+    by the length of the stream. Array values are written in full, as JSON
+    lists.
+
+    Parameters
+    ----------
+    db : Broker
+    header : Header
+    stream_name : str
+    fp : str
+        file path
+    chunk_size : int, optional
+        Default is ``CHUNK_SIZE``.
+    progress : callable, optional
+        expected signature: ``f(count)``; called with the number of events
+        written so far after each chunk
+    cancel : threading.Event, optional
+        when set, writing stops after the current chunk, leaving a partial
+        file
+    **kwargs
+        passed to ``iter_tables``
+
+    Returns
+    -------
+    count : int
+        number of events written
+    """
+    count = 0
+    with open(fp, 'w', newline='') as f:
+        for table in iter_tables(db, header, stream_name, chunk_size,
+                                 **kwargs):
+            if cancel is not None and cancel.is_set():
+                break
+            for key in table.columns:
+                if table[key].dtype == object:
+                    table[key] = table[key].map(_text)
+            table.to_csv(f, header=(count == 0))
+            count += len(table)
+            if progress is not None:
+                progress(count)
+    return count
+
+
+def _text(value):
+    "Spell out array values, which str() would abbreviate with '...'."
+    if isinstance(value, (np.ndarray, list, tuple)):
+        return json.dumps(np.asarray(value).tolist(), default=str)
+    return value
+
+
+def _arrow_array(column):
+    import pyarrow as pa
+    if column.ndim > 1:
+        # a fixed-size list per row, holding the flattened array
+        size = int(np.prod(column.shape[1:]))
+        values = pa.array(np.ascontiguousarray(column).reshape(-1))
+        return pa.FixedSizeListArray.from_arrays(values, size)
+    if column.dtype == object:
+        return pa.array(list(column))
+    return pa.array(column)
+
+
+def _arrow_table(columns, schema=None):
+    import pyarrow as pa
+    arrays = []
+    schema_fields = []
+    for key, column in columns.items():
+        array = _arrow_array(column)
+        arrays.append(array)
+        metadata = None
+        if column.ndim > 1:
+            # Record the shape so readers can restore the arrays.
+            metadata = {'shape': json.dumps(column.shape[1:])}
+        schema_fields.append(pa.field(key, array.type, metadata=metadata))
+    table = pa.Table.from_arrays(arrays, schema=pa.schema(schema_fields))
+    if schema is not None and not table.schema.equals(schema):
+        table = table.cast(schema)  # e.g., ints in one chunk, floats in later
+    return table
+
+
+def _write_arrow(open_writer, db, header, stream_name, chunk_size, progress,
+                 cancel, kwargs):
+    writer = None
+    schema = None
+    count = 0
+    try:
+        for columns in iter_columns(db, header, stream_name, chunk_size,
+                                    **kwargs):
+            if cancel is not None and cancel.is_set():
+                break
+            table = _arrow_table(columns, schema)
+            if writer is None:
+                schema = table.schema
+                writer = open_writer(schema)
+            writer.write_table(table)
+            count += len(columns['seq_num'])
+            if progress is not None:
+                progress(count)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def write_parquet(db, header, stream_name, fp, chunk_size=CHUNK_SIZE,
+                  compression='zstd', progress=None, cancel=None, **kwargs):
+    """
+    Write the events of one stream to a Parquet file, a chunk at a time.
+
+    Columns are those of ``iter_columns``. Array-valued fields are stored as
+    fixed-size lists of their flattened values, with their shape in the
+    field's metadata under 'shape'. Each chunk becomes a row group. No file
+    is written for a stream without events. Requires pyarrow.
+
+    Parameters
+    ----------
+    db : Broker
+    header : Header
+    stream_name : str
+    fp : str
+        file path
+    chunk_size : int, optional
+        Default is ``CHUNK_SIZE``.
+    compression : str, optional
+        Parquet codec, such as 'zstd', 'snappy', 'gzip' or 'none'. Default
+        is 'zstd'.
+    progress : callable, optional
+        expected signature: ``f(count)``; called with the number of events
+        written so far after each chunk
+    cancel : threading.Event, optional
+        when set, writing stops after the current chunk, leaving a partial
+        file
+    **kwargs
+        passed to ``iter_columns``
+
+    Returns
+    -------
+    count : int
+        number of events written
+    """
+    import pyarrow.parquet as pq
+    return _write_arrow(
+        lambda schema: pq.ParquetWriter(fp, schema, compression=compression),
+        db, header, stream_name, chunk_size, progress, cancel, kwargs)
+
+
+def write_arrow(db, header, stream_name, fp, chunk_size=CHUNK_SIZE,
+                compression='zstd', progress=None, cancel=None, **kwargs):
+    """
+    Write the events of one stream to an Arrow IPC (Feather v2) file.
+
+    The layout is that of ``write_parquet``; each chunk becomes a record
+    batch, so the file can be memory-mapped and read without copying.
+    Requires pyarrow.
+
+    Parameters
+    ----------
+    db : Broker
+    header : Header
+    stream_name : str
+    fp : str
+        file path
+    chunk_size : int, optional
+        Default is ``CHUNK_SIZE``.
+    compression : str, optional
+        'zstd', 'lz4' or None. Default is 'zstd'. Compressed buffers must be
+        decompressed when read, so use None for zero-copy reads.
+    progress : callable, optional
+        expected signature: ``f(count)``
+    cancel : threading.Event, optional
+    **kwargs
+        passed to ``iter_columns``
+
+    Returns
+    -------
+    count : int
+        number of events written
+    """
+    import pyarrow as pa
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    return _write_arrow(
+        lambda schema: pa.ipc.new_file(fp, schema, options=options),
+        db, header, stream_name, chunk_size, progress, cancel, kwargs)
+
+
+def write_hdf5(db, header, stream_name, group, chunk_size=CHUNK_SIZE,
+               compression='gzip', progress=None, cancel=None, **kwargs):
+    """
+    Write the events of one stream into an HDF5 group, a chunk at a time.
+
+    A subgroup named stream_name is created in group, holding a dataset per
+    column of ``iter_columns``. Array-valued fields become datasets of shape
+    (events, ...). Datasets are chunked and compressed, and grow as chunks
+    of events are written. Requires h5py.
+
+    Parameters
+    ----------
+    db : Broker
+    header : Header
+    stream_name : str
+    group : h5py.Group
+        e.g., an open h5py.File
+    chunk_size : int, optional
+        Default is ``CHUNK_SIZE``.
+    compression : str, optional
+        HDF5 filter, such as 'gzip' or 'lzf', or None. Default is 'gzip'.
+    progress : callable, optional
+        expected signature: ``f(count)``
+    cancel : threading.Event, optional
+    **kwargs
+        passed to ``iter_columns``
+
+    Returns
+    -------
+    count : int
+        number of events written
+    """
+    import h5py
+    stream = group.require_group(stream_name)
+    count = 0
+    for columns in iter_columns(db, header, stream_name, chunk_size,
+                                **kwargs):
+        if cancel is not None and cancel.is_set():
+            break
+        n = len(columns['seq_num'])
+        for key, column in columns.items():
+            dtype = column.dtype
+            if dtype.kind == 'U' or (dtype == object and
+                                     all(isinstance(val, str)
+                                         for val in column)):
+                column = column.astype(object)
+                dtype = h5py.string_dtype()
+            elif dtype == object:
+                raise ValueError("The values of {!r} do not have one shape "
+                                 "and type, so they cannot be written to "
+                                 "HDF5.".format(key))
+            if key not in stream:
+                stream.create_dataset(key, shape=(0,) + column.shape[1:],
+                                      maxshape=(None,) + column.shape[1:],
+                                      dtype=dtype, chunks=True,
+                                      compression=compression)
+            dataset = stream[key]
+            dataset.resize(count + n, axis=0)
+            dataset[count:] = column
+        count += n
+        if progress is not None:
+            progress(count)
+    return count
+
+
+# Excel's limit on rows per sheet, including the row of column names
+EXCEL_MAX_ROWS = 1048576
+
+# Excel's limit on characters per cell
+EXCEL_MAX_CHARS = 32767
+
+
+def _cell(key, value):
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    text = _text(value)  # e.g., an array
+    if not isinstance(text, str):
+        text = str(text)
+    if len(text) > EXCEL_MAX_CHARS:
+        raise ValueError("The values of {!r} are too large for Excel cells. "
+                         "Leave the field out, export it unfilled (which "
+                         "writes references to the data), or use another "
+                         "format.".format(key))
+    return text
+
+
+def _sheet_title(stream_name, part):
+    # Titles are at most 31 characters and cannot contain []:*?/\
+    name = stream_name.translate({ord(c): '_' for c in '[]:*?/\\'})
+    if part == 1:
+        return name[:31]
+    suffix = ' ({})'.format(part)
+    return name[:31 - len(suffix)] + suffix
+
+
+def write_xlsx(db, header, fp, streams=None, fields=None,
+               chunk_size=CHUNK_SIZE, max_rows=EXCEL_MAX_ROWS, progress=None,
+               cancel=None, **kwargs):
+    """
+    Write event streams to the sheets of an Excel document, streaming rows.
+
+    The workbook is written in openpyxl's write-only mode, so memory use
+    stays flat however long the streams are. A stream with more rows than
+    fit on a sheet continues on sheets named like 'primary (2)'. Times are
+    written as local datetimes; array values are written as JSON lists, and
+    an array too long for a cell (``EXCEL_MAX_CHARS``) raises ValueError.
+    Requires openpyxl.
+
+    Parameters
+    ----------
+    db : Broker
+    header : Header
+    fp : str
+        file path
+    streams : list, optional
+        names of the streams to write. Default is every stream, in order.
+    fields : dict, optional
+        maps stream names to the fields of each to write. Default is every
+        field.
+    chunk_size : int, optional
+        Default is ``CHUNK_SIZE``.
+    max_rows : int, optional
+        rows per sheet, including the column names. Default is Excel's
+        limit, ``EXCEL_MAX_ROWS``.
+    progress : callable, optional
+        expected signature: ``f(stream_name, count)``; called with the number
+        of events of a stream written so far after each chunk
+    cancel : threading.Event, optional
+        when set, writing stops and no file is saved
+    **kwargs
+        passed to ``iter_columns``
+
+    Returns
+    -------
+    count : int
+        number of events written, or None if cancelled
+    """
+    import openpyxl
+    if streams is None:
+        streams = stream_names(header)
+    workbook = openpyxl.Workbook(write_only=True)
+    total = 0
+    for name in streams:
+        sheet = None
+        part = 0
+        rows = 0
+        count = 0
+        for columns in iter_columns(
+                db, header, name, chunk_size,
+                fields=None if fields is None else fields.get(name),
+                **kwargs):
+            if cancel is not None and cancel.is_set():
+                return None
+            values = []
+            for key, column in columns.items():
+                if key == 'time':
+                    values.append([datetime.fromtimestamp(t)
+                                   for t in column.tolist()])
+                elif column.ndim > 1 or column.dtype == object:
+                    values.append([_cell(key, val) for val in column])
+                else:
+                    values.append(column.tolist())
+            for row in zip(*values):
+                if sheet is None or rows == max_rows:
+                    part += 1
+                    sheet = workbook.create_sheet(_sheet_title(name, part))
+                    sheet.append(list(columns))
+                    rows = 1
+                sheet.append(row)
+                rows += 1
+            count += len(columns['seq_num'])
+            if progress is not None:
+                progress(name, count)
+        total += count
+    if not workbook.worksheets:
+        workbook.create_sheet()  # A workbook must have a sheet.
+    workbook.save(fp)
+    return total
+
+
+# formats that export_run writes as a directory of files, by file extension
+_RUN_WRITERS = {'csv': ('.csv', write_csv),
+                'parquet': ('.parquet', write_parquet),
+                'arrow': ('.arrow', write_arrow)}
+
+
+def export_run(db, header, dest, format='parquet', fields=None,
+               progress=None, cancel=None, **kwargs):
+    """
+    Export every stream of a run into a multi-run dataset, resumably.
+
+    For 'csv', 'parquet' and 'arrow', dest is a directory and each stream is
+    written to ``dest/<stream>/uid=<uid>/data.<ext>``, so each stream's
+    directory reads as one dataset of many runs, with the run as a
+    (Hive-style) partition: e.g., ``pyarrow.dataset.dataset(dest + '/primary',
+    partitioning='hive')``. Files are written under a temporary name and
+    renamed when complete, and streams whose file already exists are
+    skipped.
+
+    For 'hdf5', dest is an open h5py File (or Group) and the run is written
+    to the group ``<uid>``, with a subgroup per stream as in ``write_hdf5``
+    and the start document as JSON in the attribute 'start'. The attribute
+    'complete' is set when done; a run already complete is skipped, and an
+    incomplete one is rewritten.
+
+    So exporting the same runs to the same dest again resumes an export
+    that was interrupted or cancelled.
+
+    Parameters
+    ----------
+    db : Broker
+    header : Header
+    dest : str or h5py.Group
+    format : {'parquet', 'arrow', 'csv', 'hdf5'}, optional
+        Default is 'parquet'.
+    fields : dict, optional
+        maps the names of the streams to export to the fields of each to
+        export, or None for all of them; other streams are skipped. Default
+        is every field of every stream.
+    progress : callable, optional
+        expected signature: ``f(stream_name, count)``
+    cancel : threading.Event, optional
+    **kwargs
+        passed to the writer, e.g., ``write_parquet``
+    """
+    uid = header['start']['uid']
+    if fields is None:
+        fields = OrderedDict((name, None) for name in stream_names(header))
+
+    def cancelled():
+        return cancel is not None and cancel.is_set()
+
+    def stream_progress(name):
+        if progress is None:
+            return None
+        return lambda count: progress(name, count)
+
+    if format == 'hdf5':
+        group = dest.get(uid)
+        if group is not None:
+            if group.attrs.get('complete'):
+                return  # exported before
+            del dest[uid]  # partly exported; start over
+        group = dest.create_group(uid)
+        group.attrs['start'] = json.dumps(dict(header['start']), default=repr)
+        for name, chosen in fields.items():
+            if cancelled():
+                return
+            write_hdf5(db, header, name, group, cancel=cancel,
+                       progress=stream_progress(name), fields=chosen,
+                       **kwargs)
+        if not cancelled():
+            group.attrs['complete'] = True
+        return
+    try:
+        ext, write = _RUN_WRITERS[format]
+    except KeyError:
+        raise ValueError("format must be one of {!r}, not {!r}".format(
+            sorted(_RUN_WRITERS) + ['hdf5'], format))
+    for name, chosen in fields.items():
+        if cancelled():
+            return
+        directory = os.path.join(dest, name, 'uid={}'.format(uid))
+        fp = os.path.join(directory, 'data' + ext)
+        if os.path.exists(fp):
+            continue  # exported before
+        os.makedirs(directory, exist_ok=True)
+        part = fp + '.part'
+        try:
+            write(db, header, name, part, cancel=cancel,
+                  progress=stream_progress(name), fields=chosen,
+                  **kwargs)
+        except Exception:
+            _remove(part)
+            raise
+        if cancelled():
+            _remove(part)
+            return
+        if os.path.exists(part):  # None is written for a stream of no events.
+            os.replace(part, fp)
+
+
+def _remove(fp):
+    try:
+        os.remove(fp)
+    except OSError:
+        pass  # never created
+
+
+def export_runs(db, headers, dest, format='parquet', workers=4,
+                progress=None, cancel=None, **kwargs):
+    """
+    Export many runs in parallel into a multi-run dataset, resumably.
+
+    See ``export_run`` for the layout of dest and how resuming works. For
+    'hdf5', dest is the path of a file, which is created if needed.
+
+    Parameters
+    ----------
+    db : Broker
+    headers : iterable
+    dest : str
+        a directory, or for 'hdf5' a file
+    format : {'parquet', 'arrow', 'csv', 'hdf5'}, optional
+        Default is 'parquet'.
+    workers : int, optional
+        number of runs exported at once. Default is 4. For 'hdf5', runs are
+        exported one at a time.
+    progress : callable, optional
+        expected signature: ``f(uid, stream_name, count)``
+    cancel : threading.Event, optional
+    **kwargs
+        passed to ``export_run``, e.g., ``fields``, and on to the writer
+
+    Returns
+    -------
+    failures : dict
+        maps the uid of each run that could not be exported to the exception
+    """
+    def run(header, group):
+        uid = header['start']['uid']
+        export_run(db, header, group, format, cancel=cancel,
+                   progress=(None if progress is None else
+                             lambda name, count: progress(uid, name, count)),
+                   **kwargs)
+
+    if format == 'hdf5':
+        import h5py
+        # h5py writes a file from one thread at a time.
+        with h5py.File(dest, 'a') as f:
+            return _run_all(run, headers, f, workers=1)
+    return _run_all(run, headers, dest, workers)
+
+
+def _run_all(run, headers, dest, workers):
+    failures = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(header['start']['uid'], executor.submit(run, header, dest))
+                   for header in headers]
+        for uid, future in futures:
+            exc = future.exception()
+            if exc is not None:
+                failures[uid] = exc
+    return failures
+
+
+def image_fields(header):
+    """
+    List the (stream name, field) pairs of a run that hold images.
+
+    These are the externally stored fields with at least two dimensions,
+    which ``db.get_images`` can read.
+    """
+    return [(d.get('name', 'primary'), key)
+            for d in header.descriptors
+            for key, data_key in sorted(d['data_keys'].items())
+            if ('external' in data_key and
+                len(data_key.get('shape') or []) >= 2)]
+
+
+def write_images(images, fp, format='hdf5', chunks=None, compression='gzip',
+                 dataset='images', progress=None, cancel=None):
+    """
+    Write a series of images to a chunked, compressed HDF5 or Zarr array.
+
+    Images are read a chunk's worth at a time (``chunks[0]`` of them), so no
+    more than that many are held in memory.
+
+    Parameters
+    ----------
+    images : sequence
+        of arrays of one shape, such as the result of ``db.get_images``,
+        which reads each image when it is indexed
+    fp : str
+        file path (for Zarr, a directory)
+    format : {'hdf5', 'zarr'}, optional
+        Default is 'hdf5'.
+    chunks : tuple, optional
+        chunk shape, including the number of images per chunk first, e.g.,
+        ``(4, 256, 256)``, so with one more dimension than an image.
+        Default is one whole image per chunk.
+    compression : str, optional
+        HDF5 filter, such as 'gzip' or 'lzf', or None. Default is 'gzip'.
+        Zarr arrays use Zarr's default compressor.
+    dataset : str, optional
+        name of the HDF5 dataset. Default is 'images'.
+    progress : callable, optional
+        expected signature: ``f(count)``; called with the number of images
+        written so far after each chunk
+    cancel : threading.Event, optional
+        when set, writing stops after the current chunk
+
+    Returns
+    -------
+    count : int
+        number of images written
+    """
+    total = len(images)
+    if not total:
+        raise ValueError("There are no images to write.")
+    first = np.asarray(images[0])
+    shape = (total,) + first.shape
+    if chunks is None:
+        chunks = (1,) + first.shape
+    if len(chunks) != len(shape):
+        raise ValueError("chunks {!r} must have {} dimensions, one for the "
+                         "images and one per dimension of an image {!r}."
+                         "".format(tuple(chunks), len(shape), first.shape))
+    chunks = tuple(min(c, s) or 1 for c, s in zip(chunks, shape))
+    if format == 'hdf5':
+        import h5py
+        with h5py.File(fp, 'w') as f:
+            array = f.create_dataset(dataset, shape=shape, dtype=first.dtype,
+                                     chunks=chunks, compression=compression)
+            return _write_frames(images, array, chunks[0], progress, cancel)
+    elif format == 'zarr':
+        import zarr
+        array = zarr.open_array(store=fp, mode='w', shape=shape, chunks=chunks,
+                                dtype=first.dtype)
+        return _write_frames(images, array, chunks[0], progress, cancel)
+    raise ValueError("format must be 'hdf5' or 'zarr', not "
+                     "{!r}".format(format))
+
+
+def _write_frames(images, array, step, progress, cancel):
+    count = 0
+    for start in range(0, len(images), step):
+        if cancel is not None and cancel.is_set():
+            break
+        stop = min(start + step, len(images))
+        # Whole chunks at a time, so that each is compressed only once.
+        array[start:stop] = np.stack([np.asarray(images[i])
+                                      for i in range(start, stop)])
+        count = stop
+        if progress is not None:
+            progress(count)
+    return count
@@ -0,0 +1,333 @@
+import json
+import numbers
+import sqlite3
+import threading
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    uid TEXT PRIMARY KEY,
+    time REAL,
+    has_stop INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_time ON runs (time);
+CREATE TABLE IF NOT EXISTS fields (
+    uid TEXT,
+    key TEXT,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS fields_key_value ON fields (key, value);
+CREATE INDEX IF NOT EXISTS fields_uid ON fields (uid);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# Longer lists (e.g., trajectories) are left out of the index.
+_MAX_LIST_LENGTH = 100
+
+
+def _flatten(doc, prefix=''):
+    """
+    Yield (dotted key, scalar value) pairs from a nested document.
+
+    Each element of a short list is yielded under the list's key, matching
+    the Broker's treatment of a scalar query against a list-valued field.
+    """
+    for key, val in doc.items():
+        key = '{}{}'.format(prefix, key)
+        if hasattr(val, 'items'):
+            yield from _flatten(val, key + '.')
+        elif isinstance(val, (list, tuple)):
+            if len(val) <= _MAX_LIST_LENGTH:
+                for elem in val:
+                    if hasattr(elem, 'items'):
+                        yield from _flatten(elem, key + '.')
+                    elif _is_scalar(elem):
+                        yield key, elem
+        elif _is_scalar(val):
+            yield key, val
+
+
+def _is_scalar(val):
+    return val is None or isinstance(val, (str, bool, numbers.Number))
+
+
+def _encode(val):
+    if isinstance(val, numbers.Number) and not isinstance(val, bool):
+        val = val.item() if hasattr(val, 'item') else val  # numpy scalars
+        # 20.0 must match 20, as it does in MongoDB.
+        if isinstance(val, float) and val.is_integer():
+            val = int(val)
+    return json.dumps(val)
+
+
+def _newest(last_time, headers):
+    "The latest of last_time and the start times of headers."
+    times = [header['start']['time'] for header in headers]
+    if last_time is not None:
+        times.append(last_time)
+    return max(times) if times else None
+
+
+def _has_fts5(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(a)")
+    except sqlite3.OperationalError:
+        return False
+    conn.execute("DROP TABLE temp.fts5_probe")
+    return True
+
+
+class MetadataIndex:
+    """
+    A local, on-disk index of start and stop documents for fast searches.
+
+    Call ``sync`` to index runs added to db since the last sync. Queries take
+    the same form as Broker queries but are answered from the index:
+    ``key=value`` terms match start document fields (dotted keys address
+    nested fields; keys prefixed with ``stop.`` address the stop document),
+    ``start_time`` and ``stop_time`` bound the start time, and ``text`` is a
+    free-text search over all indexed fields.
+
+    Parameters
+    ----------
+    db : Broker
+    path : str, optional
+        SQLite database file. Default is ':memory:', an index that is not
+        saved.
+    recheck_window : float, optional
+        Runs that had not finished when they were indexed are re-indexed on
+        sync if they started within this many seconds of the newest indexed
+        run. Default is one day.
+    lookup_size : int, optional
+        number of Headers retrieved from db per query when iterating over
+        the results of a call. Default is 100.
+
+    Example
+    -------
+    >>> index = MetadataIndex(db, 'runs.sqlite')
+    >>> index.sync()  # slow the first time; incremental afterwards
+    >>> uids = index.search(plan_name='scan', text='gold')
+    >>> headers = list(index(plan_name='scan', text='gold'))
+    """
+    def __init__(self, db, path=':memory:', recheck_window=86400,
+                 lookup_size=100):
+        self.db = db
+        self.path = path
+        self.recheck_window = recheck_window
+        self.lookup_size = lookup_size
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+            self._fts = _has_fts5(self._conn)
+            if self._fts:
+                self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS "
+                                   "runs_text USING fts5(uid UNINDEXED, body)")
+            else:
+                self._conn.execute("CREATE TABLE IF NOT EXISTS "
+                                   "runs_text (uid TEXT, body TEXT)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()
+        return row[0]
+
+    @property
+    def last_time(self):
+        "Start time of the newest run indexed by a completed sync, or None."
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta "
+                                     "WHERE key = 'last_time'").fetchone()
+        return None if row is None else row[0]
+
+    def sync(self, batch_size=1000):
+        """
+        Index runs that started since the newest run already indexed.
+
+        The newest start time is recorded only once the whole pass has
+        finished, because db yields runs newest first: a sync that is
+        interrupted is redone in full by the next one.
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            number of runs to index per transaction. Default is 1000.
+
+        Returns
+        -------
+        count : int
+            number of runs (re-)indexed
+        """
+        last_time = self.last_time
+        if last_time is None:
+            headers = self.db()
+            recheck = []
+        else:
+            headers = self.db(start_time=last_time)
+            with self._lock:
+                recheck = [uid for uid, in self._conn.execute(
+                    "SELECT uid FROM runs WHERE has_stop = 0 AND time >= ?",
+                    (last_time - self.recheck_window,))]
+        count = 0
+        newest = last_time
+        batch = []
+        for header in headers:
+            batch.append(header)
+            if len(batch) >= batch_size:
+                count += self._add(batch)
+                newest = _newest(newest, batch)
+                batch = []
+        newest = _newest(newest, batch)
+        for uid in recheck:
+            try:
+                batch.append(self.db[uid])
+            except (KeyError, ValueError):
+                pass  # no longer in db
+        count += self._add(batch)
+        if newest is not None:
+            with self._lock, self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) "
+                                   "VALUES ('last_time', ?)", (newest,))
+        return count
+
+    def _add(self, headers):
+        rows = []
+        for header in headers:
+            start = header['start']
+            try:
+                stop = header['stop']
+            except (KeyError, ValueError):
+                stop = None
+            stop = stop or None  # Some versions give {} for a running run.
+            pairs = list(_flatten(start))
+            if stop is not None:
+                pairs.extend(_flatten(stop, 'stop.'))
+            body = ' '.join('{} {}'.format(key, val) for key, val in pairs)
+            rows.append((start['uid'], start['time'], stop is not None,
+                         [(start['uid'], key, _encode(val))
+                          for key, val in pairs], body))
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            uids = [(row[0],) for row in rows]
+            self._conn.executemany("DELETE FROM fields WHERE uid = ?", uids)
+            self._conn.executemany("DELETE FROM runs_text WHERE uid = ?", uids)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO runs (uid, time, has_stop) "
+                "VALUES (?, ?, ?)", [row[:3] for row in rows])
+            self._conn.executemany(
+                "INSERT INTO fields (uid, key, value) VALUES (?, ?, ?)",
+                [pair for row in rows for pair in row[3]])
+            self._conn.executemany(
+                "INSERT INTO runs_text (uid, body) VALUES (?, ?)",
+                [(row[0], row[4]) for row in rows])
+        return len(rows)
+
+    @staticmethod
+    def supports(query):
+        """
+        Whether a query can be answered by the index.
+
+        Parameters
+        ----------
+        query : dict
+
+        Returns
+        -------
+        bool
+        """
+        for key, val in query.items():
+            if key in ('start_time', 'stop_time'):
+                if not isinstance(val, numbers.Number):
+                    return False
+            elif key == 'text':
+                if not isinstance(val, str):
+                    return False
+            elif key.startswith('$') or key in ('data_key', 'since', 'until'):
+                return False
+            elif not _is_scalar(val):
+                return False
+        return True
+
+    def search(self, **query):
+        """
+        Find runs matching a query, newest first.
+
+        Returns
+        -------
+        uids : list
+        """
+        if not self.supports(query):
+            raise ValueError("This query cannot be answered by the index: "
+                             "{!r}".format(query))
+        clauses = []
+        params = []
+        for key, val in query.items():
+            if key == 'start_time':
+                clauses.append("time >= ?")
+                params.append(val)
+            elif key == 'stop_time':
+                clauses.append("time < ?")
+                params.append(val)
+            elif key == 'text':
+                for token in val.split():
+                    if self._fts:
+                        clauses.append("uid IN (SELECT uid FROM runs_text "
+                                       "WHERE runs_text MATCH ?)")
+                        params.append('"{}"'.format(token.replace('"', '""')))
+                    else:
+                        clauses.append("uid IN (SELECT uid FROM runs_text "
+                                       "WHERE body LIKE ?)")
+                        params.append('%{}%'.format(token))
+            else:
+                clauses.append("uid IN (SELECT uid FROM fields "
+                               "WHERE key = ? AND value = ?)")
+                params.extend([key, _encode(val)])
+        sql = "SELECT uid FROM runs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY time DESC"
+        with self._lock:
+            return [uid for uid, in self._conn.execute(sql, params)]
+
+    def __call__(self, **query):
+        """
+        Find runs matching a query, newest first.
+
+        Only ``search`` is answered without asking db: Headers are retrieved
+        from db lazily, ``lookup_size`` at a time with one query each (uid
+        ``$in`` a batch).
+
+        Yields
+        ------
+        header : Header
+        """
+        uids = self.search(**query)
+        for i in range(0, len(uids), self.lookup_size):
+            yield from self._lookup(uids[i:i + self.lookup_size])
+
+    def _lookup(self, uids):
+        "Yield the Headers of uids, in order, skipping any not in db."
+        try:
+            found = {header['start']['uid']: header
+                     for header in self.db(uid={'$in': uids})}
+        except Exception:
+            found = {}
+        if not found:
+            # Perhaps db does not understand $in. Look them up one by one.
+            for uid in uids:
+                try:
+                    yield self.db[uid]
+                except (KeyError, ValueError):
+                    continue  # The index is out of date.
+            return
+        for uid in uids:
+            if uid in found:
+                yield found[uid]
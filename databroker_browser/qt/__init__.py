@@ -1,2 +1,5 @@
 from ._core import *
 from ._cross_section_2d import *
+from ._search import *
+from ._prefetch import *
+from ._tree import *
@@ -1,21 +1,46 @@
-from collections import Iterable, OrderedDict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import importlib
 import os
-from datetime import datetime
+import shutil
+import threading
+import time
 import matplotlib
-from matplotlib.backends.qt_compat import QtWidgets, QtCore
+from matplotlib.backends.qt_compat import QtWidgets, QtCore, QtGui
 from matplotlib.figure import Figure
+import numpy as np
+from .._cache import LRUCache
+from .._export import (stream_names, stream_fields, write_csv, write_parquet,
+                       write_arrow, write_hdf5, write_xlsx, export_run,
+                       image_fields, write_images, _data_keys)
+from ._prefetch import Prefetcher
+from ._tree import HeaderTreeModel, PathFilterModel, _tree_entries
+from ._search import (SearchEngine, SearchResults, LiveUpdater,
+                      ResultListModel, ResultTableModel, normalize_query,
+                      is_refinement, header_matches, tabulate)
 
 
 CLIPBOARD = QtWidgets.QApplication.clipboard()
 
 
-class Placeholder:
-    """An empty placeholder with the same interface as the classes below
+class _Invoker(QtCore.QObject):
+    """Call functions on the thread that created this, e.g., the GUI thread.
 
-    i.e., a ``widget`` attribute that is a ``QWidget``
+    Calls are queued, so this is safe to use from worker threads.
     """
+    _call = QtCore.pyqtSignal(object, object)
+
     def __init__(self):
-        self.widget = QtWidgets.QWidget()
+        super().__init__()
+        self._call.connect(self._run)
+
+    def __call__(self, func, *args):
+        self._call.emit(func, args)
+
+    @QtCore.pyqtSlot(object, object)
+    def _run(self, func, args):
+        func(*args)
 
 
 def fill_item(item, value):
@@ -23,171 +48,729 @@ def fill_item(item, value):
     Display a dictionary as a QtWidgets.QtTreeWidget
 
     adapted from http://stackoverflow.com/a/21806048/1221924
+
+    This builds every node up front; ``HeaderTreeModel`` builds them lazily.
     """
     item.setExpanded(True)
-    if hasattr(value, 'items'):
-        for key, val in sorted(value.items()):
-            child = QtWidgets.QTreeWidgetItem()
-            # val is dict or a list -> recurse
-            if hasattr(val, 'items') or _listlike(val):
-                child.setText(0, _short_repr(key).strip("'"))
-                item.addChild(child)
-                fill_item(child, val)
-                if key == 'descriptors':
-                    child.setExpanded(False)
-            # val is not iterable -> show key and val on one line
-            else:
-                # Show human-readable datetime alongside raw timestamp.
-                # 1484948553.567529 > '[2017-01-20 16:42:33] 1484948553.567529'
-                if (key == 'time') and isinstance(val, float):
-                    FMT = '%Y-%m-%d %H:%M:%S'
-                    ts = datetime.fromtimestamp(val).strftime(FMT)
-                    text = "time: [{}] {}".format(ts, val)
-                else:
-                    text = "{}: {}".format(_short_repr(key).strip("'"),
-                                        _short_repr(val))
-                child.setText(0, text)
-                item.addChild(child)
-
-    elif type(value) is list:
-        for val in value:
-            if hasattr(val, 'items'):
-                fill_item(item, val)
-            elif _listlike(val):
-                fill_item(item, val)
-            else:
-                child = QtWidgets.QTreeWidgetItem()
-                item.addChild(child)
-                child.setExpanded(True)
-                child.setText(0, _short_repr(val))
-    else:
+    for text, val, expandable, expanded in _tree_entries(value):
         child = QtWidgets.QTreeWidgetItem()
-        child.setText(0, _short_repr(value))
+        child.setText(0, text)
         item.addChild(child)
+        if expandable:
+            fill_item(child, val)
+            child.setExpanded(expanded)
 
 
-def _listlike(val):
-    return isinstance(val, Iterable) and not isinstance(val, str)
+def fill_widget(widget, value):
+    widget.clear()
+    fill_item(widget.invisibleRootItem(), value)
 
 
-def _short_repr(text):
-    r = repr(text)
-    if len(r) > 82:
-        r = r[:27] + '...'
-    return r
+@functools.lru_cache()
+def _deferring_canvas(FigureCanvas):
+    "Make a subclass of a Qt FigureCanvas that does not draw while hidden."
+    class DeferringFigureCanvas(FigureCanvas):
+        """
+        A canvas that postpones drawing while it is hidden (e.g., its tab is
+        not the current one) and catches up when it is shown.
+        """
+        dirty = False
 
+        def draw(self):
+            if not self.isVisible():
+                self.dirty = True
+                return
+            self.dirty = False
+            super().draw()
+
+        def showEvent(self, event):
+            super().showEvent(event)
+            if self.dirty:
+                self.draw_idle()
+
+    return DeferringFigureCanvas
+
+
+class _SnapshotLabel(QtWidgets.QLabel):
+    "A label showing a snapshot of a figure, which signals when clicked."
+    clicked = QtCore.pyqtSignal()
+
+    def mousePressEvent(self, event):
+        self.clicked.emit()
 
-def fill_widget(widget, value):
-    widget.clear()
-    fill_item(widget.invisibleRootItem(), value)
+
+class _FigureTab:
+    """
+    The widgets in one tab of figures in a HeaderViewerWidget.
+
+    The tab shows either the live canvas or a snapshot image in its place.
+    """
+    def __init__(self, name, fig, canvas, toolbar, tab, label, overplot,
+                 stack, snapshot):
+        self.name = name
+        self.fig = fig
+        self.canvas = canvas
+        self.toolbar = toolbar
+        self.tab = tab
+        self.label = label
+        self.overplot = overplot
+        self.stack = stack
+        self.snapshot = snapshot
+        self.uid = None  # the run last plotted on the canvas
+
+    def show_canvas(self):
+        self.stack.setCurrentWidget(self.canvas)
+        self.toolbar.setEnabled(True)
+
+    def show_snapshot(self, pixmap):
+        if pixmap is None:
+            # This figure was never drawn, e.g. because its tab was hidden.
+            self.snapshot.setText("Click to draw this figure.")
+        else:
+            self.snapshot.setPixmap(pixmap)
+        self.stack.setCurrentWidget(self.snapshot)
+        self.toolbar.setEnabled(False)
+
+
+class _RunSnapshots:
+    "Images of the figures drawn for one run, in the order requested."
+    def __init__(self):
+        self.names = []
+        self.images = {}  # maps name -> (RGBA array, device pixel ratio)
+        self.overplotted = False
+
+    @property
+    def nbytes(self):
+        return sum(image.nbytes for image, ratio in self.images.values())
+
+    @property
+    def usable(self):
+        "Whether the images can stand in for re-plotting this run."
+        return bool(self.names) and not self.overplotted
+
+
+def _snapshot_pixmap(image, ratio):
+    height, width, _ = image.shape
+    qimage = QtGui.QImage(image.tobytes(), width, height, width * 4,
+                          QtGui.QImage.Format_RGBA8888)
+    pixmap = QtGui.QPixmap.fromImage(qimage)
+    pixmap.setDevicePixelRatio(ratio)
+    return pixmap
+
+
+class _ExportJob:
+    "The state of one export, shared by its tasks on worker threads."
+    def __init__(self, title, fp, dialog, finish):
+        self.title = title
+        self.fp = fp
+        self.dialog = dialog
+        self.finish = finish
+        self.cancel = threading.Event()
+        self.counts = OrderedDict()  # maps stream name -> events written
+        self.pending = 0
+        self.errors = []
+
+
+def _projection(header, excluded):
+    """
+    Map each stream to export to its chosen fields, or None for all.
+
+    excluded holds the (stream name, field) pairs not to export. Streams
+    with no chosen fields are left out.
+    """
+    projection = OrderedDict()
+    for name in stream_names(header):
+        keys = stream_fields(header, name)
+        chosen = [key for key in keys if (name, key) not in excluded]
+        if len(chosen) == len(keys):
+            projection[name] = None
+        elif chosen:
+            projection[name] = chosen
+    return projection
 
 
 class TableExportWidget:
     """
     A Widget with buttons for exporting run data to tabular formats.
 
+    One widget can serve many runs: ``set_header`` rebinds it. Exports run
+    on worker threads, each writing the run that was bound when it was
+    requested, so they continue while other runs are viewed. A progress
+    dialog reports the events written per stream and can cancel an export,
+    removing the files it had not finished.
+
     Parameters
     ----------
-    header : Header
-    db : Broker
+    header : Header, optional
+    db : Broker, optional
         This argument will be removed once Headers hold a ref to their Brokers.
+    workers : int, optional
+        number of streams exported at once. Default is 4.
+    image_chunks : tuple, optional
+        chunk shape for exported images, with the number of images per chunk
+        first, e.g., ``(4, 256, 256)``. Default is one whole image per chunk.
     """
-    def __init__(self, header, db):
+    def __init__(self, header=None, db=None, workers=4, image_chunks=None):
+        self.image_chunks = image_chunks
+        self._excluded = set()  # (stream name, field) pairs not to export
+        self._fill = False  # whether to load externally stored data
         self.widget = QtWidgets.QWidget()
-        self._header = header
-        self._db = db
-        export_csv_btn = QtWidgets.QPushButton('CSV')
-        export_csv_btn.clicked.connect(self._export_csv)
-        export_xlsx_btn = QtWidgets.QPushButton('Excel')
-        export_xlsx_btn.clicked.connect(self._export_xlsx)
-        copy_uid_btn  = QtWidgets.QPushButton('Copy UID to Clipbaord')
-        copy_uid_btn.clicked.connect(
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._invoker = _Invoker()
+        self._jobs = []
+        self._export_csv_btn = QtWidgets.QPushButton('CSV')
+        self._export_csv_btn.clicked.connect(self._export_csv)
+        self._export_xlsx_btn = QtWidgets.QPushButton('Excel')
+        self._export_xlsx_btn.clicked.connect(self._export_xlsx)
+        self._export_parquet_btn = QtWidgets.QPushButton('Parquet')
+        self._export_parquet_btn.clicked.connect(self._export_parquet)
+        self._export_hdf5_btn = QtWidgets.QPushButton('HDF5')
+        self._export_hdf5_btn.clicked.connect(self._export_hdf5)
+        self._export_arrow_btn = QtWidgets.QPushButton('Arrow')
+        self._export_arrow_btn.clicked.connect(self._export_arrow)
+        self._export_images_btn = QtWidgets.QPushButton('Images')
+        self._export_images_btn.clicked.connect(self._export_images)
+        self._fields_btn = QtWidgets.QPushButton('Fields')
+        self._fields_btn.setToolTip("Choose the fields to export, so that "
+                                    "only those are loaded.")
+        self._fields_btn.clicked.connect(self._choose_fields)
+        self._copy_uid_btn  = QtWidgets.QPushButton('Copy UID to Clipbaord')
+        self._copy_uid_btn.clicked.connect(
             lambda: self._copy_uid(self._header['start']['uid']))
+        self._status = QtWidgets.QLabel()
 
-        layout = QtWidgets.QHBoxLayout()
-        layout.addWidget(export_csv_btn)
-        layout.addWidget(export_xlsx_btn)
-        layout.addWidget(copy_uid_btn)
+        buttons = QtWidgets.QHBoxLayout()
+        buttons.addWidget(self._fields_btn)
+        buttons.addWidget(self._export_csv_btn)
+        buttons.addWidget(self._export_xlsx_btn)
+        buttons.addWidget(self._export_parquet_btn)
+        buttons.addWidget(self._export_hdf5_btn)
+        buttons.addWidget(self._export_arrow_btn)
+        buttons.addWidget(self._export_images_btn)
+        buttons.addWidget(self._copy_uid_btn)
+        layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(buttons)
+        layout.addWidget(self._status)
         self.widget.setLayout(layout)
+        self.set_header(header, db)
+
+    def set_header(self, header, db):
+        """
+        Bind the buttons to a different run.
+
+        Exports already requested are unaffected.
+
+        Parameters
+        ----------
+        header : Header or None
+        db : Broker or None
+        """
+        self._header = header
+        self._db = db
+        exportable = header is not None and db is not None
+        self._fields_btn.setEnabled(exportable)
+        self._export_images_btn.setEnabled(exportable and
+                                           bool(image_fields(header)))
+        self._copy_uid_btn.setEnabled(header is not None)
+        self._show_fields()
+
+    def _projection(self):
+        "Map each stream of the bound run to export to its chosen fields."
+        return _projection(self._header, self._excluded)
+
+    def _show_fields(self):
+        # A run with no descriptors, or with every field left out, has
+        # nothing to export.
+        exportable = (self._header is not None and self._db is not None and
+                      bool(self._projection()))
+        for button in (self._export_csv_btn, self._export_xlsx_btn,
+                       self._export_parquet_btn, self._export_hdf5_btn,
+                       self._export_arrow_btn):
+            button.setEnabled(exportable)
+        if self._header is None:
+            self._fields_btn.setText('Fields')
+            return
+        total = sum(len(stream_fields(self._header, name))
+                    for name in stream_names(self._header))
+        chosen = sum(len(stream_fields(self._header, name) if fields is None
+                         else fields)
+                     for name, fields in self._projection().items())
+        if chosen == total:
+            text = 'Fields (all'
+        else:
+            text = 'Fields ({} of {}'.format(chosen, total)
+        if self._fill:
+            text += ', filled'
+        self._fields_btn.setText(text + ')')
+
+    def _choose_fields(self):
+        header = self._header
+        dialog = QtWidgets.QDialog(self.widget)
+        dialog.setWindowTitle("Fields to Export")
+        tree = QtWidgets.QTreeWidget()
+        tree.setHeaderLabels(['Field', 'Type'])
+        items = {}  # maps (stream name, field) -> item
+        for name in stream_names(header):
+            stream_item = QtWidgets.QTreeWidgetItem(tree, [name])
+            stream_item.setFlags(stream_item.flags() |
+                                 QtCore.Qt.ItemIsUserCheckable |
+                                 QtCore.Qt.ItemIsTristate)
+            data_keys = _data_keys(header, name)
+            for key in stream_fields(header, name):
+                data_key = data_keys[key]
+                kind = '{} {}'.format(data_key.get('dtype', ''),
+                                      data_key.get('shape') or '')
+                if 'external' in data_key:
+                    kind += ' (external)'
+                item = QtWidgets.QTreeWidgetItem(stream_item, [key, kind])
+                item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+                item.setCheckState(0, QtCore.Qt.Unchecked
+                                   if (name, key) in self._excluded
+                                   else QtCore.Qt.Checked)
+                items[name, key] = item
+        tree.expandAll()
+        tree.resizeColumnToContents(0)
+        fill = QtWidgets.QCheckBox("Load externally stored data (e.g., "
+                                   "images); otherwise export references to "
+                                   "it")
+        fill.setChecked(self._fill)
+        buttons = QtWidgets.QDialogButtonBox(
+            QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout = QtWidgets.QVBoxLayout()
+        layout.addWidget(tree)
+        layout.addWidget(fill)
+        layout.addWidget(buttons)
+        dialog.setLayout(layout)
+        if dialog.exec_() != QtWidgets.QDialog.Accepted:
+            return
+        # Choices are remembered by name, so they carry over to similar runs.
+        self._excluded.difference_update(items)
+        self._excluded.update(pair for pair, item in items.items()
+                              if item.checkState(0) != QtCore.Qt.Checked)
+        self._fill = fill.isChecked()
+        self._show_fields()
 
-    @QtCore.pyqtSlot()
     def _copy_uid(self, uid):
         CLIPBOARD.setText(uid)
 
-    @QtCore.pyqtSlot()
+    def _start(self, title, fp, tasks, finish=None):
+        """
+        Run the tasks of an export on the worker threads.
+
+        Each task is a pair ``(func, paths)``. func is called on a worker
+        thread as ``func(progress, cancel)``, where ``progress(name,
+        count)`` reports events written (e.g., per stream) and ``cancel`` is
+        a threading.Event to check between chunks. paths are the files it
+        writes, which are removed if it fails or is cancelled. finish, if
+        given, is called on the GUI thread once every task is done.
+        """
+        if not tasks:
+            if finish is not None:
+                finish()
+            self._show_status("Nothing to export")
+            return
+        dialog = QtWidgets.QProgressDialog(title, "Cancel", 0, len(tasks),
+                                           self.widget)
+        dialog.setWindowTitle("Export")
+        dialog.setWindowModality(QtCore.Qt.NonModal)
+        dialog.setMinimumDuration(500)
+        job = _ExportJob(title, fp, dialog, finish)
+        dialog.canceled.connect(job.cancel.set)
+        self._jobs.append(job)
+        self._show_status()
+        for func, paths in tasks:
+            job.pending += 1
+            self._executor.submit(self._run, job, func, paths)
+
+    def _run(self, job, func, paths):
+        exc = None
+        if not job.cancel.is_set():
+            try:
+                func(lambda name, count: self._invoker(self._progress, job,
+                                                       name, count),
+                     job.cancel)
+            except Exception as err:
+                exc = err
+        if exc is not None or job.cancel.is_set():
+            for path in paths:
+                try:
+                    if os.path.isdir(path):  # e.g., a Zarr array
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                except OSError:
+                    pass  # never created
+        self._invoker(self._task_finished, job, exc)
+
+    def _progress(self, job, name, count):
+        job.counts.pop(name, None)
+        job.counts[name] = count  # Put the latest last.
+        lines = ['{}: {} events'.format(name, count)
+                 for name, count in list(job.counts.items())[-10:]]
+        if len(job.counts) > 10:
+            lines.insert(0, '({} more)'.format(len(job.counts) - 10))
+        job.dialog.setLabelText('\n'.join([job.title] + lines))
+
+    def _task_finished(self, job, exc):
+        job.pending -= 1
+        if exc is not None:
+            job.errors.append(exc)
+        job.dialog.setValue(job.dialog.value() + 1)
+        if job.pending:
+            return
+        job.dialog.canceled.disconnect()
+        job.dialog.close()
+        job.dialog.deleteLater()
+        self._jobs.remove(job)
+        if job.finish is not None:
+            job.finish()
+        if job.errors:
+            text = "Export to {} failed: {!r}".format(job.fp, job.errors[0])
+        elif job.cancel.is_set():
+            text = "Export to {} cancelled".format(job.fp)
+        else:
+            text = "Exported {} ({} events)".format(
+                job.fp, sum(job.counts.values()))
+        self._show_status(text)
+
+    def _show_status(self, text=''):
+        if self._jobs:
+            text = "Exporting ({} in progress)...".format(len(self._jobs))
+        self._status.setText(text)
+
+    def _missing_package(self, package, feature):
+        msg = QtWidgets.QMessageBox()
+        msg.setIcon(QtWidgets.QMessageBox.Critical)
+        msg.setText("Feature Not Available")
+        msg.setInformativeText("The Python package {} must be installed to "
+                               "enable {} export. Use CSV export instead."
+                               "".format(package, feature))
+        msg.setWindowTitle("Error")
+        msg.exec_()
+
+    def _export_streams(self, caption, title, write):
+        """
+        Export each event stream to its own file, in parallel.
+
+        write is called like ``write_csv``.
+        """
+        fp, _ = QtWidgets.QFileDialog.getSaveFileName(self.widget, caption)
+        if not fp:
+            return
+        # Create a separate file for each event stream, named like
+        # 'mydata-primary.csv', 'mydata-baseline.csv', ....
+        # Events are streamed in chunks, so any length of run fits in memory.
+        header, db, fill = self._header, self._db, self._fill
+        base, ext = os.path.splitext(fp)
+        tasks = []
+        for name, fields in self._projection().items():
+            path = '{}-{}{}'.format(base, name, ext)
+
+            def task(progress, cancel, name=name, path=path, fields=fields):
+                write(db, header, name, path, cancel=cancel,
+                      progress=lambda count: progress(name, count),
+                      fields=fields, fill=fill)
+            tasks.append((task, [path]))
+        self._start(title, fp, tasks)
+
     def _export_csv(self):
+        self._export_streams('Export CSV', "Exporting CSV files", write_csv)
+
+    def export_runs(self, headers, db):
+        """
+        Ask for a format and destination, and export many runs in parallel.
+
+        Runs are exported into one multi-run dataset: a directory (CSV,
+        Parquet, Arrow) or an HDF5 file. Exporting to the same destination
+        again resumes an export that was interrupted or cancelled, skipping
+        what was finished. See ``databroker_browser._export.export_run``.
+
+        Parameters
+        ----------
+        headers : list
+        db : Broker
+        """
+        formats = OrderedDict([('Parquet', ('parquet', 'pyarrow')),
+                               ('Arrow', ('arrow', 'pyarrow')),
+                               ('CSV', ('csv', None)),
+                               ('HDF5', ('hdf5', 'h5py'))])
+        label, ok = QtWidgets.QInputDialog.getItem(
+            self.widget, 'Export Runs',
+            'Export {} runs as:'.format(len(headers)), list(formats), 0,
+            False)
+        if not ok:
+            return
+        format, package = formats[label]
+        if package is not None:
+            try:
+                importlib.import_module(package)
+            except ImportError:
+                self._missing_package(package, label)
+                return
+        finish = None
+        if format == 'hdf5':
+            # Choosing an existing file resumes or adds to it.
+            fp, _ = QtWidgets.QFileDialog.getSaveFileName(
+                self.widget, 'Export Runs to HDF5',
+                options=QtWidgets.QFileDialog.DontConfirmOverwrite)
+            if not fp:
+                return
+            import h5py
+            try:
+                dest = h5py.File(fp, 'a')
+            except OSError as exc:
+                self._show_status("Export to {} failed: {!r}".format(fp, exc))
+                return
+            finish = dest.close
+        else:
+            fp = dest = QtWidgets.QFileDialog.getExistingDirectory(
+                self.widget, 'Export Runs to Directory')
+            if not fp:
+                return
+        # The fields chosen, by stream and name, apply to every run. Each
+        # run's streams are looked up on the worker thread.
+        excluded = frozenset(self._excluded)
+        # One task per run; their files are kept when cancelled, to resume.
+        # h5py writes a file from one thread at a time, so for HDF5 one task
+        # exports the runs one after another.
+        if format == 'hdf5':
+            tasks = [(functools.partial(self._export_runs, db, headers, dest,
+                                        format, excluded, self._fill), [])]
+        else:
+            tasks = [(functools.partial(self._export_run, db, header, dest,
+                                        format, excluded, self._fill), [])
+                     for header in headers]
+        self._start("Exporting {} runs".format(len(headers)), fp, tasks,
+                    finish)
+
+    @staticmethod
+    def _export_run(db, header, dest, format, excluded, fill, progress,
+                    cancel):
+        uid = header['start']['uid']
+        export_run(db, header, dest, format, cancel=cancel,
+                   progress=lambda name, count: progress(
+                       '{:.8} {}'.format(uid, name), count),
+                   fields=_projection(header, excluded), fill=fill)
+
+    @classmethod
+    def _export_runs(cls, db, headers, dest, format, excluded, fill,
+                     progress, cancel):
+        "Export runs one after another, going on past any that fail."
+        errors = []
+        for header in headers:
+            if cancel.is_set():
+                break
+            try:
+                cls._export_run(db, header, dest, format, excluded, fill,
+                                progress, cancel)
+            except Exception as exc:
+                errors.append(exc)
+        if errors:
+            raise errors[0]
+
+    def _export_parquet(self):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            self._missing_package('pyarrow', 'Parquet')
+        else:
+            self._export_streams('Export Parquet', "Exporting Parquet files",
+                                 write_parquet)
+
+    def _export_arrow(self):
+        try:
+            import pyarrow
+        except ImportError:
+            self._missing_package('pyarrow', 'Arrow')
+        else:
+            self._export_streams('Export Arrow', "Exporting Arrow files",
+                                 write_arrow)
+
+    def _export_hdf5(self):
+        try:
+            import h5py
+        except ImportError:
+            self._missing_package('h5py', 'HDF5')
+            return
         fp, _ = QtWidgets.QFileDialog.getSaveFileName(self.widget,
-                                                      'Export CSV')
+                                                      'Export HDF5')
         if not fp:
             return
-        # Create a separate CSV for each event stream, named like
-        # 'mydata-primary.xlsx', 'mydata-baseline.xlsx', ....
-        base, ext = os.path.splitext(fp)
-        tables = {d['name']: self._db.get_table(self._header,
-                                                stream_name=d['name'])
-                  for d in self._header.descriptors}
-        for name, df in tables.items():
-            df.to_csv('{}-{}{}'.format(base, name, ext))
+        header, db = self._header, self._db
+        # One file, with a group per stream. HDF5 writes to a file one at a
+        # time, so this is one task.
+        self._start("Exporting an HDF5 file", fp,
+                    [(functools.partial(self._write_hdf5, header, db, fp,
+                                        self._projection(), self._fill),
+                      [fp])])
+
+    @staticmethod
+    def _write_hdf5(header, db, fp, projection, fill, progress, cancel):
+        import h5py
+        with h5py.File(fp, 'w') as f:
+            for name, fields in projection.items():
+                if cancel.is_set():
+                    return
+                write_hdf5(db, header, name, f, cancel=cancel,
+                           progress=lambda count: progress(name, count),
+                           fields=fields, fill=fill)
+
+    def _export_images(self):
+        header, db = self._header, self._db
+        fields = OrderedDict(('{} ({})'.format(key, stream), (stream, key))
+                             for stream, key in image_fields(header))
+        label, ok = QtWidgets.QInputDialog.getItem(
+            self.widget, 'Export Images', 'Field:', list(fields), 0, False)
+        if not ok:
+            return
+        stream, key = fields[label]
+        fp, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self.widget, 'Export Images', filter='HDF5 (*.h5);;Zarr (*.zarr)')
+        if not fp:
+            return
+        format = 'zarr' if fp.endswith('.zarr') else 'hdf5'
+        package = {'hdf5': 'h5py', 'zarr': 'zarr'}[format]
+        try:
+            importlib.import_module(package)
+        except ImportError:
+            self._missing_package(package, 'image')
+            return
+        chunks = self.image_chunks
+
+        def task(progress, cancel):
+            images = db.get_images(header, key, stream_name=stream)
+            write_images(images, fp, format, chunks=chunks, cancel=cancel,
+                         progress=lambda count: progress(key, count))
+        self._start("Exporting images", fp, [(task, [fp])])
 
-    @QtCore.pyqtSlot()
     def _export_xlsx(self):
         try:
             import openpyxl
         except ImportError:
-            msg = QtWidgets.QMessageBox()
-            msg.setIcon(QtWidgets.QMessageBox.Critical)
-            msg.setText("Feature Not Available")
-            msg.setInformativeText("The Python package openpyxl must be "
-                                   "installed to enable Excel export. Use "
-                                   "CSV export instead.")
-            msg.setWindowTitle("Error")
-            msg.exec_()
+            self._missing_package('openpyxl', 'Excel')
         else:
-            from pandas import ExcelWriter
             fp, _ = QtWidgets.QFileDialog.getSaveFileName(self.widget,
                                                           'Export XLSX')
             if not fp:
                 return
-            # Write each event stream to a different spreadsheet in one
-            # Excel document.
-            writer = ExcelWriter(fp)
-            tables = {d['name']: self._db.get_table(self._header,
-                                                    stream_name=d['name'])
-                      for d in self._header.descriptors}
-            for name, df in tables.items():
-                df.to_excel(writmer, name)
-            writer.save()
+            header, db, fill = self._header, self._db, self._fill
+            projection = self._projection()
+            # Each event stream goes to its own sheet(s) in one document,
+            # which is written by one task.
+            self._start("Exporting an Excel file", fp,
+                        [(lambda progress, cancel: write_xlsx(
+                            db, header, fp, streams=list(projection),
+                            fields=projection, fill=fill, progress=progress,
+                            cancel=cancel),
+                          [fp])])
 
 
 class HeaderViewerWidget:
     """
     Widget containing a tree view of md, a text summary, and tabs of figures.
 
+    Headers are loaded on a worker thread (text_dispatch and data_dispatch)
+    and then rendered on the GUI thread (fig_dispatch, the metadata tree).
+    Showing a new Header abandons the one still loading.
+
     Parameters
     ----------
     fig_dispatch : callable
-        expected signature: ``f(header, fig_factory)``
+        expected signature: ``f(header, fig_factory)``, or
+        ``f(header, fig_factory, data)`` if data_dispatch is given
     text_dispatch : callable
         expected signature: ``f(header) -> str``
+    prefetch_dispatch : callable, optional
+        expected signature: ``f(header)``; called on a worker thread by
+        ``prefetch`` to warm whatever fig_dispatch will read (e.g., event
+        data)
+    data_dispatch : callable, optional
+        expected signature: ``f(header) -> data``; called on a worker thread
+        to load whatever fig_dispatch plots, so that fig_dispatch only has to
+        draw
+    cache_size : int, optional
+        number of recently shown Headers whose text summary and metadata
+        tree (including which nodes were expanded) are kept for instant
+        redisplay. Default is 32.
+    max_figures : int, optional
+        maximum number of figure tabs. When a new figure name is requested
+        beyond this, the least recently used tab is cleared and reused for
+        it. Default is 8.
+    snapshot_bytes : int, optional
+        memory budget for images of the figures of recently shown Headers.
+        A Header shown again displays these images, without running
+        data_dispatch or fig_dispatch, until a figure is clicked. Set to 0
+        to disable. Default is 256MB.
+    prefetch_size : int, optional
+        number of prefetched Headers held until they are shown. Default is
+        4.
+    prefetch_bytes : int, optional
+        approximate limit on memory held by prefetched Headers' loaded data
+        (from data_dispatch). Default is 256MB.
+    image_chunks : tuple, optional
+        chunk shape for exported images, with the number of images per chunk
+        first, e.g., ``(4, 256, 256)``. Default is one whole image per chunk.
     """
-    def __init__(self, fig_dispatch, text_dispatch):
+    def __init__(self, fig_dispatch, text_dispatch, prefetch_dispatch=None,
+                 data_dispatch=None, cache_size=32, max_figures=8,
+                 snapshot_bytes=256 * 2**20, prefetch_size=4,
+                 prefetch_bytes=256 * 2**20, image_chunks=None):
+        self.max_figures = max_figures
+        self._snapshots = None
+        if snapshot_bytes:
+            # maps uid -> _RunSnapshots
+            self._snapshots = LRUCache(max_bytes=snapshot_bytes,
+                                       sizeof=lambda snaps: snaps.nbytes)
+        self._rendering_uid = None
+        self._header = None
+        self._db = None
         self.fig_dispatch = fig_dispatch
         self.text_dispatch = text_dispatch
+        self.prefetch_dispatch = prefetch_dispatch
+        self.data_dispatch = data_dispatch
+        # maps uid -> (text, data)
+        self._prefetched = LRUCache(prefetch_size, prefetch_bytes)
+        self._views = LRUCache(cache_size)  # maps uid -> (text, tree model)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._invoker = _Invoker()
+        self._generation = 0
+        self._future = None
         self._tabs = QtWidgets.QTabWidget()
         self.widget = QtWidgets.QWidget()
         self._text_summary = QtWidgets.QLabel()
-        self._tree = QtWidgets.QTreeWidget()
+        self._tree = QtWidgets.QTreeView()
+        self._tree.setHeaderHidden(True)
+        self._tree.setUniformRowHeights(True)
         self._tree.setAlternatingRowColors(True)
-        self._figures = OrderedDict()
-        self._overplot = {}
+        self._tree.setModel(HeaderTreeModel())
+        self._tree.expanded.connect(
+            lambda index: index.model().set_expanded(index, True))
+        self._tree.collapsed.connect(
+            lambda index: index.model().set_expanded(index, False))
+        # While filtering, matching leaves are listed by key path instead.
+        self._tree_filter = QtWidgets.QLineEdit()
+        self._tree_filter.setPlaceholderText("Filter metadata")
+        self._tree_filter.textChanged.connect(self._apply_tree_filter)
+        self._tree_filter_model = PathFilterModel()
+        self._tree_matches = QtWidgets.QListView()
+        self._tree_matches.setUniformItemSizes(True)
+        self._tree_matches.setModel(self._tree_filter_model)
+        self._tree_stack = QtWidgets.QStackedWidget()
+        self._tree_stack.addWidget(self._tree)
+        self._tree_stack.addWidget(self._tree_matches)
+        self._figures = OrderedDict()  # maps name -> _FigureTab, LRU first
 
         tree_container = QtWidgets.QVBoxLayout()
         layout = QtWidgets.QHBoxLayout()
         tree_container.addWidget(self._text_summary)
         tree_container.addWidget(QtWidgets.QLabel("View Header (metadata):"))
-        tree_container.addWidget(self._tree)
+        tree_container.addWidget(self._tree_filter)
+        tree_container.addWidget(self._tree_stack)
         tree_container.addWidget(QtWidgets.QLabel("Export Events (data):"))
-        self.export_widget = Placeholder()  # placeholder
+        # Created once and rebound to each Header shown.
+        self.export_widget = TableExportWidget(image_chunks=image_chunks)
         tree_container.addWidget(self.export_widget.widget)
         layout.addLayout(tree_container)
         layout.addWidget(self._tabs)
@@ -207,51 +790,230 @@ class HeaderViewerWidget:
             raise Exception("matplotlib backend is {!r} but it expected to be"
                             "one of ('Qt4Agg', 'Qt5Agg')".format(backend))
         # Stash them on the instance to avoid needing to re-import.
-        self.FigureCanvas = FigureCanvas
+        # Figures in hidden tabs are only drawn once their tab is shown.
+        self.FigureCanvas = _deferring_canvas(FigureCanvas)
         self.NavigationToolbar = NavigationToolbar
 
     def _figure(self, name):
         "matching plt.figure API"
-        # Find a figure with the desired name; if none, create one.
-        if name not in self._figures:
-            self._figures[name] = self._add_figure(name)
-        fig = self._figures[name]
+        figure_tab = self._figure_tab(name)
+        figure_tab.show_canvas()
+        fig = figure_tab.fig
         # If overplotting is not allowed, clear the figure.
-        if not self._overplot[name].isChecked():
+        if not figure_tab.overplot.isChecked():
             fig.clf()
+        # Note which run this is for, so its rendering can be snapshotted.
+        uid = figure_tab.uid = self._rendering_uid
+        snapshots = self._snapshots.get(uid) if self._snapshots else None
+        if snapshots is not None:
+            if name not in snapshots.names:
+                snapshots.names.append(name)
+            if figure_tab.overplot.isChecked():
+                snapshots.overplotted = True
         # Bring the appropriate tab into focus.
-        self._tabs.setCurrentIndex(list(self._figures).index(name))
+        self._tabs.setCurrentWidget(figure_tab.tab)
         return fig
 
+    def _figure_tab(self, name):
+        # Find a figure with the desired name; if none, create one or, if
+        # there are too many, take over the least recently used one.
+        if name in self._figures:
+            self._figures.move_to_end(name)
+        elif len(self._figures) >= self.max_figures:
+            self._figures[name] = self._recycle_figure(name)
+        else:
+            self._figures[name] = self._add_figure(name)
+        return self._figures[name]
+
     def __call__(self, header, db=None):
         """
+        Show a Header, loading it in the background unless prefetched.
+
         header : Header
         db : Broker
             This will be removed once Headers hold a ref to their Brokers.
         """
-        self.fig_dispatch(header, self._figure)
-        text = self.text_dispatch(header)
+        self._show(header, db, use_snapshots=True)
+
+    def _show(self, header, db, use_snapshots):
+        self._generation += 1  # Abandon anything still loading.
+        if self._future is not None:
+            self._future.cancel()
+        self._header = header
+        self._db = db
+        uid = header['start']['uid']
+        snapshots = None
+        if use_snapshots and self._snapshots is not None:
+            snapshots = self._snapshots.get(uid)
+            if snapshots is not None and not snapshots.usable:
+                snapshots = None
+        loaded = self._prefetched.pop(uid, None)
+        if (loaded is None and uid in self._views and
+                (self.data_dispatch is None or snapshots is not None)):
+            loaded = self._views[uid][0], None  # Nothing left to load.
+        if loaded is not None:
+            self._render(self._generation, header, db, loaded, None,
+                         snapshots)
+            return
+        self._text_summary.setText("Loading...")
+        # Nothing shown may be taken for the new run while it loads.
+        self._set_tree_model(HeaderTreeModel())
+        self._apply_tree_filter()
+        self.export_widget.set_header(None, None)
+        self._future = self._executor.submit(self._load_async,
+                                             self._generation, header, db,
+                                             snapshots)
+
+    def _load(self, header, data=True):
+        "Do the slow, GUI-independent part of displaying a Header."
+        # Fetch the stop document and descriptors here, so that the tree and
+        # export panel do not wait on db on the GUI thread.
+        try:
+            header['stop']
+        except (KeyError, ValueError):
+            pass
+        getattr(header, 'descriptors', None)
+        view = self._views.get(header['start']['uid'])
+        if view is not None:
+            text = view[0]
+        else:
+            text = self.text_dispatch(header)
+        loaded_data = None
+        if data and self.data_dispatch is not None:
+            loaded_data = self.data_dispatch(header)
+        return text, loaded_data
+
+    def _load_async(self, generation, header, db, snapshots):
+        if generation != self._generation:
+            return  # superseded before it started
+        try:
+            # Snapshots stand in for the figures, so skip loading their data.
+            loaded = self._load(header, data=snapshots is None)
+        except Exception as exc:
+            self._invoker(self._render, generation, header, db, None, exc,
+                          snapshots)
+        else:
+            self._invoker(self._render, generation, header, db, loaded, None,
+                          snapshots)
+
+    def _render(self, generation, header, db, loaded, exc, snapshots=None):
+        if generation != self._generation:
+            return  # superseded while loading
+        if exc is not None:
+            self._text_summary.setText("Failed to load: {!r}".format(exc))
+            # Its data can still be exported.
+            self.export_widget.set_header(header, db)
+            return
+        text, data = loaded
+        if snapshots is not None:
+            self._show_snapshots(snapshots)
+        else:
+            uid = header['start']['uid']
+            if self._snapshots is not None:
+                self._snapshots[uid] = _RunSnapshots()
+            self._rendering_uid = uid
+            try:
+                if self.data_dispatch is not None:
+                    self.fig_dispatch(header, self._figure, data)
+                else:
+                    self.fig_dispatch(header, self._figure)
+            finally:
+                self._rendering_uid = None
         self._text_summary.setText(text)
-        fill_widget(self._tree, header)
-
-        # Remove and destroy the old export widget. Create and add a new one.
-        self.tree_container.removeWidget(self.export_widget.widget)
-        self.export_widget.widget.deleteLater()
-        if db is not None:
-            self.export_widget = TableExportWidget(header, db)
-            self.tree_container.addWidget(self.export_widget.widget)
+        self._show_tree(header, text)
+        self.export_widget.set_header(header, db)
+
+    def _show_tree(self, header, text):
+        uid = header['start']['uid']
+        view = self._views.get(uid)
+        if view is not None:
+            model = view[1]
         else:
-            self.export_widget = Placholder()
+            # Only the top level starts out expanded; deeper nodes are built
+            # when they are expanded.
+            model = HeaderTreeModel(header)
+        self._views[uid] = text, model
+        self._set_tree_model(model)
+        for index in list(model.expanded_indexes()):
+            self._tree.expand(index)
+        self._apply_tree_filter()
+
+    def _set_tree_model(self, model):
+        old_selection_model = self._tree.selectionModel()
+        self._tree.setModel(model)
+        old_selection_model.deleteLater()
+
+    def _apply_tree_filter(self):
+        text = self._tree_filter.text()
+        if not text:
+            self._tree_stack.setCurrentWidget(self._tree)
+            return
+        path_index = self._tree.model().path_index()
+        self._tree_filter_model.set_filter(path_index, text)
+        self._tree_stack.setCurrentWidget(self._tree_matches)
+
+    def prefetch(self, header):
+        """
+        Do the work of displaying a Header that can be done ahead of time.
+
+        This is safe to call from a worker thread. It fetches the stop
+        document and descriptors, calls text_dispatch and data_dispatch, and
+        calls prefetch_dispatch, if any.
+        """
+        uid = header['start']['uid']
+        if uid in self._prefetched:
+            return
+        loaded = self._load(header)
+        if self.prefetch_dispatch is not None:
+            self.prefetch_dispatch(header)
+        self._prefetched[uid] = loaded
+        cache = self._prefetched
+        if cache.max_bytes is not None and cache.nbytes > cache.max_bytes:
+            # The cache keeps its newest item even if that alone is over
+            # budget. Drop it; it will be loaded again if it is shown.
+            self._prefetched.pop(uid, None)
+
+    def _show_snapshots(self, snapshots):
+        "Show images of a run's figures in place of their canvases."
+        for name in snapshots.names:
+            figure_tab = self._figure_tab(name)
+            image = snapshots.images.get(name)
+            figure_tab.show_snapshot(None if image is None
+                                     else _snapshot_pixmap(*image))
+        self._tabs.setCurrentWidget(figure_tab.tab)
+
+    def _on_snapshot_clicked(self):
+        # The user wants to interact with the figures. Plot them for real.
+        self._show(self._header, self._db, use_snapshots=False)
+
+    def _on_canvas_draw(self, figure_tab):
+        uid = figure_tab.uid
+        if self._snapshots is None or uid is None:
+            return
+        snapshots = self._snapshots.get(uid)
+        if snapshots is None or figure_tab.name not in snapshots.names:
+            return
+        canvas = figure_tab.canvas
+        ratio = (getattr(canvas, 'device_pixel_ratio', None) or
+                 getattr(canvas, '_dpi_ratio', 1))
+        snapshots.images[figure_tab.name] = (np.array(canvas.buffer_rgba()),
+                                             ratio)
+        self._snapshots[uid] = snapshots  # Re-measure it.
 
     def _add_figure(self, name):
         tab = QtWidgets.QWidget()
         overplot = QtWidgets.QCheckBox("Allow overplotting")
         overplot.setChecked(False)
-        self._overplot[name] = overplot
         fig = Figure((5.0, 4.0), dpi=100)
         canvas = self.FigureCanvas(fig)
         canvas.setMinimumWidth(640)
-        canvas.setParent(tab)
+        snapshot = _SnapshotLabel()
+        snapshot.setAlignment(QtCore.Qt.AlignCenter)
+        snapshot.setToolTip("Click to interact with this figure.")
+        snapshot.clicked.connect(self._on_snapshot_clicked)
+        stack = QtWidgets.QStackedWidget()
+        stack.addWidget(canvas)
+        stack.addWidget(snapshot)
         toolbar = self.NavigationToolbar(canvas, tab)
         tab_label = QtWidgets.QLabel(name)
         tab_label.setMaximumHeight(20)
@@ -259,11 +1021,30 @@ class HeaderViewerWidget:
         layout = QtWidgets.QVBoxLayout()
         layout.addWidget(overplot)
         layout.addWidget(tab_label)
-        layout.addWidget(canvas)
+        layout.addWidget(stack)
         layout.addWidget(toolbar)
         tab.setLayout(layout)
         self._tabs.addTab(tab, '{:.8}'.format(name))
-        return fig
+        figure_tab = _FigureTab(name, fig, canvas, toolbar, tab, tab_label,
+                                overplot, stack, snapshot)
+        canvas.mpl_connect('draw_event',
+                           lambda event: self._on_canvas_draw(figure_tab))
+        return figure_tab
+
+    def _recycle_figure(self, name):
+        "Evict the least recently used figure and reuse its tab for name."
+        old_name, figure_tab = self._figures.popitem(last=False)
+        figure_tab.name = name
+        figure_tab.uid = None
+        figure_tab.show_canvas()
+        figure_tab.fig.clf()
+        # Forget the evicted figure's zoom/pan history (Home, Back).
+        figure_tab.toolbar.update()
+        figure_tab.overplot.setChecked(False)
+        figure_tab.label.setText(name)
+        self._tabs.setTabText(self._tabs.indexOf(figure_tab.tab),
+                              '{:.8}'.format(name))
+        return figure_tab
 
 
 class HeaderViewerWindow(HeaderViewerWidget):
@@ -276,6 +1057,8 @@ class HeaderViewerWindow(HeaderViewerWidget):
         expected signature: ``f(header, fig_factory)``
     text_dispatch : callable
         expected signature: ``f(header) -> str``
+    **kwargs
+        passed through to ``HeaderViewerWidget``
 
     Example
     -------
@@ -290,8 +1073,8 @@ class HeaderViewerWindow(HeaderViewerWidget):
     >>> h = db[-1]
     >>> view(h)  # spawns Qt window for viewing h
     """
-    def __init__(self, fig_dispatch, text_dispatch):
-        super().__init__(fig_dispatch, text_dispatch)
+    def __init__(self, fig_dispatch, text_dispatch, **kwargs):
+        super().__init__(fig_dispatch, text_dispatch, **kwargs)
         self._window = QtWidgets.QMainWindow()
         self._window.setCentralWidget(self.widget)
         self._window.show()
@@ -310,52 +1093,401 @@ class BrowserWidget:
         expected signature: ``f(header) -> str``
     result_dispatch : callable
         expected signature: ``f(header) -> str``
+    search_delay : float, optional
+        Seconds to wait after the last keystroke before querying. Queries run
+        on a worker thread. Default is 0.3.
+    search_cache_size : int, optional
+        Number of queries whose results are kept for instant recall.
+        Default is 32.
+    search_cache_bytes : int, optional
+        Approximate limit on memory held by cached results. Default is 256MB.
+    search_cache_check_interval : float, optional
+        Cached results are discarded when a run newer than any seen before
+        appears in db. This is checked at most once per this many seconds.
+        Default is 5.
+    index : MetadataIndex, optional
+        If given, queries that it supports are answered from this local
+        index instead of db. It is synced in the background; until the
+        first sync has finished, and while it lags behind the newest run
+        seen, db is queried instead.
+    index_sync_interval : float, optional
+        Seconds between background syncs of the index. Default is 60.
+    label_cache_size : int, optional
+        Number of results' labels (from result_dispatch) to remember across
+        searches. Default is 10000.
+    label_workers : int, optional
+        Number of threads calling result_dispatch. Default is 4.
+    live : bool, optional
+        Whether to start in live mode, adding new runs that match the query
+        to the results as they appear. This can be toggled in the GUI.
+        Default is False.
+    live_interval : float, optional
+        Seconds between polls for new runs in live mode. Default is 5.
+    results_view : {'list', 'table'}, optional
+        Show results as a list labeled by result_dispatch, which retrieves
+        results as they are scrolled into view, or as a sortable table of
+        summary fields (time, scan_id, plan_name, uid, duration,
+        exit_status), which retrieves all results up front. Default is
+        'list'.
+    prefetch : int, optional
+        Number of results on either side of the selected one to prepare in
+        the background while idle, so that stepping through results is
+        fast. Default is 2.
+    prefetch_dispatch : callable, optional
+        expected signature: ``f(header)``; called on a worker thread for
+        each result being prefetched, to warm whatever fig_dispatch will
+        read (e.g., event data)
+    data_dispatch : callable, optional
+        expected signature: ``f(header) -> data``; called on a worker thread
+        to load what fig_dispatch plots. If given, fig_dispatch is called as
+        ``f(header, fig_factory, data)``.
+    viewer_cache_size : int, optional
+        Number of recently viewed runs whose summary and metadata tree are
+        kept for instant redisplay. Default is 32.
+    max_figures : int, optional
+        Maximum number of figure tabs; beyond this the least recently used
+        is reused. Default is 8.
+    snapshot_bytes : int, optional
+        Memory budget for images of recently viewed runs' figures, which
+        are shown on revisiting a run until a figure is clicked. Set to 0 to
+        always re-plot. Default is 256MB.
+    prefetch_bytes : int, optional
+        Approximate limit on memory held by prefetched results' loaded data
+        (from data_dispatch). Default is 256MB.
+    image_chunks : tuple, optional
+        Chunk shape for exported images, with the number of images per chunk
+        first, e.g., ``(4, 256, 256)``. Default is one whole image per chunk.
     """
-    def __init__(self, db, fig_dispatch, text_dispatch, result_dispatch):
+    def __init__(self, db, fig_dispatch, text_dispatch, result_dispatch,
+                 search_delay=0.3, search_cache_size=32,
+                 search_cache_bytes=256 * 2**20,
+                 search_cache_check_interval=5,
+                 index=None, index_sync_interval=60,
+                 label_cache_size=10000, label_workers=4,
+                 live=False, live_interval=5, results_view='list',
+                 prefetch=2, prefetch_dispatch=None, data_dispatch=None,
+                 viewer_cache_size=32, max_figures=8,
+                 snapshot_bytes=256 * 2**20, prefetch_bytes=256 * 2**20,
+                 image_chunks=None):
         self.db = db
-        self._hvw = HeaderViewerWidget(fig_dispatch, text_dispatch)
+        self.prefetch = prefetch
+        self.index = index
+        self._index_sync = None
+        self._index_ready = False  # whether a sync has completed
+        self._index_sync_lock = threading.Lock()
+        if index is not None:
+            self._index_executor = ThreadPoolExecutor(max_workers=1)
+            self._index_timer = QtCore.QTimer()
+            self._index_timer.setInterval(int(index_sync_interval * 1000))
+            self._index_timer.timeout.connect(self._sync_index)
+            self._index_timer.start()
+            self._sync_index()
+        self.search_cache_check_interval = search_cache_check_interval
+        self._search_cache = LRUCache(search_cache_size, search_cache_bytes,
+                                      sizeof=lambda results: results.nbytes)
+        self._search_cache_epoch = None  # start time of newest run seen
+        self._search_cache_checked = -float('inf')
+        # The newest run is looked up on a worker thread, off the keystroke
+        # path, and compared with the epoch on the GUI thread.
+        self._search_cache_executor = ThreadPoolExecutor(max_workers=1)
+        self._search_cache_check = None
+        self._shown_from_cache = None  # query whose cached results are shown
+        self._invoker = _Invoker()
+        self._hvw = HeaderViewerWidget(fig_dispatch, text_dispatch,
+                                       prefetch_dispatch=prefetch_dispatch,
+                                       data_dispatch=data_dispatch,
+                                       cache_size=viewer_cache_size,
+                                       max_figures=max_figures,
+                                       snapshot_bytes=snapshot_bytes,
+                                       prefetch_size=max(2 * prefetch, 1),
+                                       prefetch_bytes=prefetch_bytes,
+                                       image_chunks=image_chunks)
+        self._prefetcher = Prefetcher(self._hvw.prefetch)
         self.fig_dispatch = fig_dispatch
         self.text_dispatch = text_dispatch
         self.result_dispatch = result_dispatch
-        self._results = QtWidgets.QListWidget()
-        self._results.currentItemChanged.connect(
+        self._results_filter = None
+        prepare = None
+        if results_view == 'list':
+            self._results_model = ResultListModel(
+                result_dispatch, label_cache_size=label_cache_size,
+                label_workers=label_workers)
+            self._results = QtWidgets.QListView()
+            self._results.setUniformItemSizes(True)
+            page_prefetch = 100  # results pulled on the worker up front
+        elif results_view == 'table':
+            self._results_model = ResultTableModel()
+            self._results = QtWidgets.QTableView()
+            self._results.setSortingEnabled(True)
+            self._results.setSelectionBehavior(
+                QtWidgets.QAbstractItemView.SelectRows)
+            self._results.verticalHeader().setVisible(False)
+            self._results_filter = QtWidgets.QLineEdit()
+            self._results_filter.setPlaceholderText("Filter results")
+            self._results_filter.textChanged.connect(
+                self._results_model.set_text_filter)
+            # The table needs all the results, and their stop documents.
+            page_prefetch = None
+            prepare = tabulate
+        else:
+            raise ValueError("results_view must be 'list' or 'table', not "
+                             "{!r}".format(results_view))
+        self._results_model.fetch_failed.connect(self._on_search_failed)
+        self._results.setModel(self._results_model)
+        # The current run is viewed; the selected runs can be exported.
+        self._results.setSelectionMode(
+            QtWidgets.QAbstractItemView.ExtendedSelection)
+        self._export_selected_btn = QtWidgets.QPushButton(
+            'Export Selected Runs')
+        self._export_selected_btn.clicked.connect(self._export_selected)
+        self._results.selectionModel().currentChanged.connect(
             self._on_results_selection_changed)
         self._search_bar = QtWidgets.QLineEdit()
         self._search_bar.textChanged.connect(self._on_search_text_changed)
+        self._search_engine = SearchEngine(self._find, delay=search_delay,
+                                           prefetch=page_prefetch,
+                                           prepare=prepare)
+        self._search_engine.busy.connect(self._on_search_busy)
+        self._search_engine.results_ready.connect(self._on_search_results)
+        self._search_engine.failed.connect(self._on_search_failed)
+        self._live = LiveUpdater(self._find_live, interval=live_interval)
+        self._live.new_results.connect(self._on_live_results)
+        self._live_checkbox = QtWidgets.QCheckBox('Live')
+        self._live_checkbox.toggled.connect(self.set_live)
+        self._live_checkbox.setChecked(live)
         self.widget = QtWidgets.QWidget()
-        
+
         layout = QtWidgets.QVBoxLayout()
+        search_layout = QtWidgets.QHBoxLayout()
+        search_layout.addWidget(self._search_bar)
+        search_layout.addWidget(self._live_checkbox)
         sublayout = QtWidgets.QHBoxLayout()
-        layout.addWidget(self._search_bar)
+        layout.addLayout(search_layout)
         layout.addLayout(sublayout)
-        sublayout.addWidget(self._results)
+        results_layout = QtWidgets.QVBoxLayout()
+        if self._results_filter is not None:
+            results_layout.addWidget(self._results_filter)
+        results_layout.addWidget(self._results)
+        results_layout.addWidget(self._export_selected_btn)
+        sublayout.addLayout(results_layout)
         sublayout.addWidget(self._hvw.widget)
         self.widget.setLayout(layout)
 
-    @QtCore.pyqtSlot()
     def _on_search_text_changed(self):
+        self._shown_from_cache = None
         text = self._search_bar.text()
         try:
             query = eval("dict({})".format(text))
         except Exception:
+            self._search_engine.cancel()
             self._search_bar.setStyleSheet(BAD_TEXT_INPUT)
         else:
-            self._search_bar.setStyleSheet(GOOD_TEXT_INPUT)
-            self.search(**query)
+            if not self._show_cached(query):
+                self._search_engine.request(query)
+
+    def _on_search_busy(self, busy):
+        self._search_bar.setStyleSheet(BUSY_TEXT_INPUT if busy
+                                       else GOOD_TEXT_INPUT)
 
-    @QtCore.pyqtSlot()
-    def _on_results_selection_changed(self):
-        row_index = self._results.currentRow()
-        if row_index == -1:  # This means None. Do not update the viewer.
+    def _on_search_results(self, query, headers):
+        self._show_results(query, headers)
+
+    def _on_search_failed(self, *args):
+        self._search_bar.setStyleSheet(BAD_TEXT_INPUT)
+
+    def _on_results_selection_changed(self, current, previous):
+        if not current.isValid():  # This means None. Do not update the viewer.
             return
-        self._hvw(self._headers[row_index], self.db)
+        if previous.isValid() and current.row() == previous.row():
+            return  # Moved to another column of the same run.
+        row = current.row()
+        self._prefetcher.cancel()
+        self._hvw(self._results_model.header(row), self.db)
+        # Prepare the neighbours, nearest first, in case the user steps on.
+        model = self._results_model
+        rows = [neighbour
+                for offset in range(1, self.prefetch + 1)
+                for neighbour in (row + offset, row - offset)
+                if 0 <= neighbour < model.rowCount()]
+        self._prefetcher.schedule([model.header(r) for r in rows])
+
+    def _export_selected(self):
+        rows = sorted({index.row() for index
+                       in self._results.selectionModel().selectedIndexes()})
+        if rows:
+            self._hvw.export_widget.export_runs(
+                [self._results_model.header(row) for row in rows], self.db)
 
     def search(self, **query):
-        self._results.clear()
-        self._headers = self.db(**query)
-        for h in self._headers:
-            item = QtWidgets.QListWidgetItem(self.result_dispatch(h))
-            self._results.addItem(item)
+        """
+        Run a query and display the results.
+
+        Results are retrieved lazily as the list is scrolled. Typing in the
+        search bar queries on a worker thread instead.
+        """
+        self._search_engine.cancel()
+        if not self._show_cached(query):
+            self._show_results(query, self._find(**query))
+
+    def _find(self, **query):
+        "Query the local index if it can answer query, and otherwise db."
+        if self._use_index(query):
+            return self.index(**query)
+        return self.db(**query)
+
+    def _use_index(self, query):
+        """
+        Whether the local index can answer query with up-to-date results.
+
+        Until a sync has completed, the index may be missing runs, and its
+        results would be cached as if they were complete.
+        """
+        if (self.index is None or not self._index_ready or
+                not self.index.supports(query)):
+            return False
+        # Fall back to db if a run newer than the index has been seen.
+        latest = self._search_cache_epoch
+        last_time = self.index.last_time
+        return latest is None or (last_time is not None and
+                                  last_time >= latest)
+
+    def _sync_index(self):
+        """
+        Start a sync of the index, unless one is running; return its Future.
+
+        This is called by a timer and, in live mode, from the live worker.
+        """
+        with self._index_sync_lock:
+            if self._index_sync is None or self._index_sync.done():
+                self._index_sync = self._index_executor.submit(
+                    self.index.sync)
+                self._index_sync.add_done_callback(self._on_index_synced)
+            return self._index_sync
+
+    def _on_index_synced(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self._index_ready = True
+
+    def set_live(self, live):
+        """
+        Turn live mode on or off.
+
+        In live mode, new runs that match the current query are added to the
+        top of the results as they appear.
+        """
+        if live:
+            self._live.start()
+        else:
+            self._live.stop()
+        if self._live_checkbox.isChecked() != bool(live):
+            self._live_checkbox.setChecked(live)
+
+    def _on_live_results(self, query, headers):
+        self._results_model.prepend(headers)
+        # The cached results for this query are now out of date.
+        self._search_cache.pop(normalize_query(query), None)
+
+    def _find_live(self, **query):
+        # Bring the index up to date first, joining any sync in progress.
+        # Until the first (full) sync is done, _find uses db anyway.
+        if self.index is not None and self._index_ready:
+            try:
+                self._sync_index().result()
+            except Exception:
+                pass  # The timer will try again.
+        return self._find(**query)
+
+    def _show_results(self, query, headers):
+        self._shown_from_cache = None
+        if isinstance(headers, SearchResults):
+            results = headers  # retrieved (and tabulated) on the worker
+            results.query = query
+        else:
+            results = SearchResults(headers, query)
+        self._search_cache[normalize_query(query)] = results
+        self._results_model.set_results(results)
+        self._follow(query)
+
+    def _follow(self, query):
+        "Have the live updater follow query from the newest result shown."
+        since, seen = self._results_model.newest_runs()
+        if since is None:
+            since = time.time()
+        self._live.follow(query, since, seen)
+
+    def _show_cached(self, query):
+        """
+        Display results for query without asking db, if possible.
+
+        Use cached results for the same query or, if query only narrows a
+        query whose results are all cached, filter those. Return True if
+        results were shown.
+        """
+        self._check_search_cache()
+        key = normalize_query(query)
+        results = self._search_cache.get(key)
+        if results is None:
+            results = self._refine(query)
+            if results is None:
+                return False
+        self._search_engine.cancel()
+        # Re-insert to account for any results pulled since it was cached.
+        self._search_cache[key] = results
+        self._results_model.set_results(results)
+        self._follow(query)
+        self._shown_from_cache = query
+        return True
+
+    def _refine(self, query):
+        "Filter the smallest complete cached superset of query's results."
+        candidates = [results for results in self._search_cache.values()
+                      if results.complete and results.query is not None and
+                      is_refinement(query, results.query)]
+        if not candidates:
+            return None
+        base = min(candidates, key=lambda results: len(results.headers))
+        extra = {key: val for key, val in query.items()
+                 if key not in base.query}
+        mask = np.array([header_matches(h, extra) for h in base.headers],
+                        dtype=bool)
+        results = SearchResults([h for h, match in zip(base.headers, mask)
+                                 if match], query)
+        if base.columns is not None:
+            results.columns = {name: column[mask]
+                               for name, column in base.columns.items()}
+        return results
+
+    def _check_search_cache(self):
+        "Look for a new run on a worker thread, at most once per interval."
+        now = time.monotonic()
+        if now - self._search_cache_checked < self.search_cache_check_interval:
+            return
+        if (self._search_cache_check is not None and
+                not self._search_cache_check.done()):
+            return  # The previous check is still waiting on db.
+        self._search_cache_checked = now
+        self._search_cache_check = self._search_cache_executor.submit(
+            self._find_latest)
+
+    def _find_latest(self):
+        try:
+            latest = self.db[-1]['start']['time']
+        except Exception:
+            # An empty db, or one that cannot be reached; play it safe.
+            latest = None
+        self._invoker(self._on_latest, latest)
+
+    def _on_latest(self, latest):
+        "Clear the search cache if a new run has appeared since it was filled."
+        if latest is not None and latest == self._search_cache_epoch:
+            return
+        self._search_cache.clear()
+        self._search_cache_epoch = latest
+        # Results shown from the cache meanwhile may be missing the new run.
+        query = self._shown_from_cache
+        if query is not None:
+            self._shown_from_cache = None
+            self._search_engine.request(query)
 
 
 class BrowserWindow(BrowserWidget):
@@ -371,6 +1503,8 @@ class BrowserWindow(BrowserWidget):
         expected signature: ``f(header) -> str``
     result_dispatch : callable
         expected signature: ``f(header) -> str``
+    **kwargs
+        passed through to ``BrowserWidget``
 
     Example
     -------
@@ -384,8 +1518,10 @@ class BrowserWindow(BrowserWidget):
     >>> s = '{start[plan_name]}'
     >>> browser = BrowserWindow(db, f, t, s)
     """
-    def __init__(self, db, fig_dispatch, text_dispatch, result_dispatch):
-        super().__init__(db, fig_dispatch, text_dispatch, result_dispatch)
+    def __init__(self, db, fig_dispatch, text_dispatch, result_dispatch,
+                 **kwargs):
+        super().__init__(db, fig_dispatch, text_dispatch, result_dispatch,
+                         **kwargs)
         self._window = QtWidgets.QMainWindow()
         self._window.setCentralWidget(self.widget)
         self._window.show()
@@ -403,3 +1539,10 @@ QLineEdit {
     background-color: rgb(255, 255, 255);
 }
 """
+
+
+BUSY_TEXT_INPUT = """
+QLineEdit {
+    background-color: rgb(255, 250, 205);
+}
+"""
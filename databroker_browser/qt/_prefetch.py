@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+from matplotlib.backends.qt_compat import QtCore
+
+
+class Prefetcher(QtCore.QObject):
+    """
+    Warm caches for the runs adjacent to the selected one while idle.
+
+    Work starts once the selection has been still for ``delay`` seconds and
+    runs on worker threads, nearest neighbours first. Work not yet started
+    is abandoned when the selection changes.
+
+    Parameters
+    ----------
+    warm : callable
+        expected signature: ``f(header)``
+    delay : float, optional
+        seconds the selection must be still before prefetching starts.
+        Default is 0.2.
+    workers : int, optional
+        number of worker threads. Default is 2.
+    """
+    def __init__(self, warm, delay=0.2, workers=2):
+        super().__init__()
+        self.warm = warm
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._generation = 0
+        self._pending = []
+        self._futures = []
+        self._timer = QtCore.QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(int(delay * 1000))
+        self._timer.timeout.connect(self._start)
+
+    def schedule(self, headers):
+        """
+        Replace any outstanding work with warming these Headers, in order.
+
+        Parameters
+        ----------
+        headers : list
+        """
+        self.cancel()
+        self._pending = list(headers)
+        self._timer.start()
+
+    def cancel(self):
+        "Abandon any work that has not started."
+        self._timer.stop()
+        self._generation += 1
+        for future in self._futures:
+            future.cancel()
+        self._futures = []
+        self._pending = []
+
+    @QtCore.pyqtSlot()
+    def _start(self):
+        self._futures = [self._executor.submit(self._run, self._generation, h)
+                         for h in self._pending]
+        self._pending = []
+
+    def _run(self, generation, header):
+        if generation != self._generation:
+            return  # The selection has moved on.
+        try:
+            self.warm(header)
+        except Exception:
+            pass  # The viewer will do (and report) the work when needed.
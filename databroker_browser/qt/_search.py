@@ -0,0 +1,799 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import chain, islice
+import numbers
+from matplotlib.backends.qt_compat import QtCore
+import numpy as np
+from .._cache import LRUCache, approx_sizeof
+
+
+def normalize_query(query):
+    """
+    Convert a query into a hashable form that does not depend on key order.
+
+    Parameters
+    ----------
+    query : dict
+
+    Returns
+    -------
+    key : tuple
+    """
+    if hasattr(query, 'items'):
+        return tuple(sorted(((key, normalize_query(val))
+                             for key, val in query.items()), key=repr))
+    elif isinstance(query, (list, tuple)):
+        return tuple(normalize_query(val) for val in query)
+    elif isinstance(query, (set, frozenset)):
+        return frozenset(normalize_query(val) for val in query)
+    return query
+
+
+# Query keys that the Broker interprets itself rather than matching against
+# fields of the start document. These cannot be evaluated client-side.
+_SPECIAL_KEYS = {'start_time', 'stop_time', 'since', 'until', 'data_key',
+                 'text'}
+
+
+def _client_side(key, value):
+    """
+    Whether a query term is a plain equality test on a start document field.
+
+    Only terms known to be such are; anything else is left to the Broker.
+    """
+    return (key not in _SPECIAL_KEYS and not key.startswith('$') and
+            not key.startswith('stop.') and
+            (value is None or isinstance(value, (str, bool, numbers.Number))))
+
+
+def is_refinement(query, base):
+    """
+    Whether query only adds client-side-testable terms to base.
+
+    If so, the results of query are exactly the results of base that match
+    the added terms.
+
+    Parameters
+    ----------
+    query : dict
+    base : dict
+
+    Returns
+    -------
+    bool
+    """
+    extra = set(query) - set(base)
+    if not extra:
+        return False
+    for key, val in base.items():
+        if key not in query or (normalize_query(query[key]) !=
+                                normalize_query(val)):
+            return False
+    return all(_client_side(key, query[key]) for key in extra)
+
+
+def header_matches(header, query):
+    """
+    Test a Header against equality terms, mimicking the Broker's semantics.
+
+    Dotted keys address nested fields and a scalar matches any element of a
+    list-valued field. Terms that are not client-side-testable (see
+    ``is_refinement``) are not supported.
+
+    Parameters
+    ----------
+    header : Header
+    query : dict
+
+    Returns
+    -------
+    bool
+    """
+    for key, val in query.items():
+        doc = header['start']
+        for part in key.split('.'):
+            if not hasattr(doc, 'items') or part not in doc:
+                return False
+            doc = doc[part]
+        if doc == val:
+            continue
+        if (isinstance(doc, (list, tuple)) and
+                not isinstance(val, (list, tuple)) and val in doc):
+            continue
+        return False
+    return True
+
+
+class SearchResults:
+    """
+    Headers from a query, recorded as they are pulled so they can be replayed.
+
+    Each iteration first yields the Headers already retrieved and then
+    continues pulling from the underlying results, so a query that is
+    revisited does not need to be run again.
+
+    Parameters
+    ----------
+    results : iterable
+        Headers
+    query : dict, optional
+        the query that produced the results
+    """
+    def __init__(self, results, query=None):
+        self.query = query
+        self._source = iter(results)
+        self.headers = []
+        self.nbytes = 0
+        self.columns = None  # see tabulate
+
+    @property
+    def complete(self):
+        "Whether every result has been retrieved."
+        return self._source is None
+
+    def __iter__(self):
+        i = 0
+        while True:
+            if i < len(self.headers):
+                yield self.headers[i]
+                i += 1
+                continue
+            if self._source is None:
+                return
+            try:
+                header = next(self._source)
+            except StopIteration:
+                self._source = None
+                return
+            self.headers.append(header)
+            self.nbytes += approx_sizeof(header['start'])
+
+
+def tabulate(results):
+    """
+    Retrieve all results and extract the columns of ``ResultTableModel``.
+
+    This reads each run's stop document, so call it on a worker thread.
+
+    Parameters
+    ----------
+    results : iterable
+        Headers
+
+    Returns
+    -------
+    results : SearchResults
+        complete, with ``columns`` set
+    """
+    results = SearchResults(results)
+    results.columns = _columns(list(results))
+    return results
+
+
+class SearchEngine(QtCore.QObject):
+    """
+    Run Broker queries on a worker thread, coalescing rapid requests.
+
+    Requests made within ``delay`` seconds of each other are collapsed into
+    one query. Queries run one at a time on a worker thread; a query that has
+    not started yet is cancelled when a newer one is requested, and results
+    from a query that has been superseded are discarded. Only the results of
+    the newest query are emitted.
+
+    Parameters
+    ----------
+    db : Broker
+        or any callable with the same signature, ``db(**query)``
+    delay : float, optional
+        seconds to wait for further requests before querying. Default is 0.3.
+    prefetch : int, optional
+        number of results to pull on the worker thread before handing the
+        results to the GUI. If None, pull them all. Default is 100.
+    prepare : callable, optional
+        expected signature: ``f(results) -> results``; called on the worker
+        thread with the results before they are handed to the GUI, e.g.,
+        ``tabulate``
+
+    Signals
+    -------
+    busy(bool)
+        emitted with True when a query is scheduled and False when the newest
+        query has completed (or failed)
+    results_ready(dict, iterator)
+        the query and an iterator over its results (Headers); the first
+        ``prefetch`` of them have already been retrieved, and ``prepare``
+        has been applied
+    failed(dict, Exception)
+        the query and the exception it raised
+    """
+    busy = QtCore.pyqtSignal(bool)
+    results_ready = QtCore.pyqtSignal(object, object)
+    failed = QtCore.pyqtSignal(object, object)
+    # Emitted from the worker thread; delivered on the GUI thread.
+    _done = QtCore.pyqtSignal(int, object, object, object)
+
+    def __init__(self, db, delay=0.3, prefetch=100, prepare=None):
+        super().__init__()
+        self.db = db
+        self.prefetch = prefetch
+        self.prepare = prepare
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._generation = 0
+        self._pending_query = None
+        self._future = None
+        self._timer = QtCore.QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(int(delay * 1000))
+        self._timer.timeout.connect(self._submit)
+        self._done.connect(self._on_done)
+
+    def request(self, query):
+        """
+        Schedule a query, superseding any query not yet completed.
+
+        Parameters
+        ----------
+        query : dict
+            passed to the Broker as ``db(**query)``
+        """
+        self._pending_query = query
+        self._generation += 1  # Invalidate anything already in flight.
+        self.busy.emit(True)
+        self._timer.start()  # (Re)starts the countdown.
+
+    def cancel(self):
+        "Discard any pending or running query."
+        self._timer.stop()
+        self._generation += 1
+        if self._future is not None:
+            self._future.cancel()
+        self.busy.emit(False)
+
+    @QtCore.pyqtSlot()
+    def _submit(self):
+        query = self._pending_query
+        generation = self._generation
+        # Drop the previous query if the worker has not picked it up yet.
+        # If it is already running, its results will be discarded.
+        if self._future is not None:
+            self._future.cancel()
+        self._future = self._executor.submit(self._run, generation, query)
+
+    def _run(self, generation, query):
+        if generation != self._generation:
+            return  # superseded while waiting in the queue
+        try:
+            results = self._fetch(query)
+        except Exception as exc:
+            self._done.emit(generation, query, None, exc)
+        else:
+            self._done.emit(generation, query, results, None)
+
+    def _fetch(self, query):
+        results = iter(self.db(**query))
+        # Do the slow part (waiting for the first results) here, but leave
+        # the rest to be pulled on demand.
+        if self.prefetch is None:
+            results = list(results)
+        else:
+            head = list(islice(results, self.prefetch))
+            results = chain(head, results)
+        if self.prepare is not None:
+            results = self.prepare(results)
+        return results
+
+    @QtCore.pyqtSlot(int, object, object, object)
+    def _on_done(self, generation, query, results, exc):
+        if generation != self._generation:
+            return  # stale
+        self.busy.emit(False)
+        if exc is not None:
+            self.failed.emit(query, exc)
+        else:
+            self.results_ready.emit(query, results)
+
+
+class LiveUpdater(QtCore.QObject):
+    """
+    Poll for runs matching a query that are newer than those already shown.
+
+    Each poll queries for runs that started at or after the newest run seen
+    so far, on a worker thread, and emits only the ones not seen before.
+
+    Parameters
+    ----------
+    db : Broker
+        or any callable with the same signature, ``db(**query)``
+    interval : float, optional
+        seconds between polls. Default is 5.
+
+    Signals
+    -------
+    new_results(dict, list)
+        the query being followed and Headers of new runs, newest first
+    """
+    new_results = QtCore.pyqtSignal(object, object)
+    # Emitted from the worker thread; delivered on the GUI thread.
+    _done = QtCore.pyqtSignal(int, object)
+
+    def __init__(self, db, interval=5):
+        super().__init__()
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._generation = 0
+        self._future = None
+        self._query = None
+        self._since = None
+        self._seen = set()
+        self._timer = QtCore.QTimer()
+        self._timer.setInterval(int(interval * 1000))
+        self._timer.timeout.connect(self._poll)
+        self._done.connect(self._on_done)
+
+    @property
+    def interval(self):
+        return self._timer.interval() / 1000
+
+    @interval.setter
+    def interval(self, val):
+        self._timer.setInterval(int(val * 1000))
+
+    @property
+    def active(self):
+        return self._timer.isActive()
+
+    def start(self):
+        "Start polling."
+        self._timer.start()
+
+    def stop(self):
+        "Stop polling and discard any poll in progress."
+        self._timer.stop()
+        self._generation += 1
+
+    def follow(self, query, since, seen=()):
+        """
+        Follow a new query, replacing any previous one.
+
+        Parameters
+        ----------
+        query : dict
+        since : float
+            start time of the newest run already shown
+        seen : iterable, optional
+            uids of the runs already shown that started at ``since``
+        """
+        self._generation += 1
+        self._query = dict(query)
+        self._since = since
+        self._seen = set(seen)
+
+    @QtCore.pyqtSlot()
+    def _poll(self):
+        if self._query is None:
+            return
+        if self._future is not None and not self._future.done():
+            return  # The previous poll is still running.
+        query = dict(self._query, start_time=self._since)
+        self._future = self._executor.submit(self._run, self._generation,
+                                             query)
+
+    def _run(self, generation, query):
+        try:
+            headers = list(self.db(**query))
+        except Exception:
+            return  # Try again on the next poll.
+        self._done.emit(generation, headers)
+
+    @QtCore.pyqtSlot(int, object)
+    def _on_done(self, generation, headers):
+        if generation != self._generation:
+            return  # stale
+        fresh = [h for h in headers if h['start']['uid'] not in self._seen]
+        if not fresh:
+            return
+        newest = max(h['start']['time'] for h in fresh)
+        if newest > self._since:
+            self._since = newest
+            self._seen = set()
+        self._seen.update(h['start']['uid'] for h in fresh
+                          if h['start']['time'] == self._since)
+        fresh.sort(key=lambda h: h['start']['time'], reverse=True)
+        self.new_results.emit(self._query, fresh)
+
+
+class ResultListModel(QtCore.QAbstractListModel):
+    """
+    A list model that pulls Headers from a result iterator on demand.
+
+    Views call ``fetchMore`` as the user scrolls, so only the Headers that
+    have been scrolled into view are retrieved and labeled. Labels are
+    computed on a pool of worker threads and cached by run uid across
+    searches; until its label is ready a row shows the start of its uid.
+
+    Parameters
+    ----------
+    result_dispatch : callable
+        expected signature: ``f(header) -> str``
+    batch_size : int, optional
+        number of Headers to pull per ``fetchMore``. Default is 100.
+    label_cache_size : int, optional
+        number of labels to remember. Default is 10000.
+    label_workers : int, optional
+        number of threads computing labels. Default is 4.
+
+    Signals
+    -------
+    fetch_failed(Exception)
+        emitted if pulling from the result iterator raises
+    """
+    fetch_failed = QtCore.pyqtSignal(object)
+    # Emitted from worker threads; delivered on the GUI thread.
+    _label_ready = QtCore.pyqtSignal(int, int, str, object)
+
+    def __init__(self, result_dispatch, batch_size=100,
+                 label_cache_size=10000, label_workers=4):
+        super().__init__()
+        self.result_dispatch = result_dispatch
+        self.batch_size = batch_size
+        self._label_cache = LRUCache(label_cache_size)
+        self._label_executor = ThreadPoolExecutor(max_workers=label_workers)
+        self._label_ready.connect(self._on_label_ready)
+        self._generation = 0
+        self._prepended = 0  # rows inserted at the top since set_results
+        self._results = None
+        self._headers = []
+        self._labels = []
+
+    def set_results(self, results):
+        """
+        Replace the contents of the model.
+
+        Parameters
+        ----------
+        results : iterable
+            Headers, which will be consumed lazily
+        """
+        self.beginResetModel()
+        self._generation += 1  # Orphan labels still being computed.
+        self._prepended = 0
+        self._results = iter(results)
+        self._headers = []
+        self._labels = []
+        self.endResetModel()
+        self.fetchMore(QtCore.QModelIndex())
+
+    def prepend(self, headers):
+        """
+        Insert Headers at the top, as for new runs.
+
+        Parameters
+        ----------
+        headers : list
+        """
+        if not headers:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), 0, len(headers) - 1)
+        self._prepended += len(headers)
+        self._headers[:0] = headers
+        self._labels[:0] = [self._label(row, header)
+                            for row, header in enumerate(headers)]
+        self.endInsertRows()
+
+    def header(self, row):
+        "Return the Header displayed in a given row."
+        return self._headers[row]
+
+    def newest_runs(self):
+        """
+        Return the start time and uids of the newest run(s) retrieved so far.
+
+        Returns
+        -------
+        time : float or None
+        uids : list
+        """
+        if not self._headers:
+            return None, []
+        newest = max(h['start']['time'] for h in self._headers)
+        return newest, [h['start']['uid'] for h in self._headers
+                        if h['start']['time'] == newest]
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._headers)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        return self._labels[index.row()]
+
+    def canFetchMore(self, parent):
+        if parent.isValid():
+            return False
+        return self._results is not None
+
+    def fetchMore(self, parent):
+        if parent.isValid() or self._results is None:
+            return
+        try:
+            batch = list(islice(self._results, self.batch_size))
+        except Exception as exc:
+            self._results = None
+            self.fetch_failed.emit(exc)
+            return
+        if len(batch) < self.batch_size:
+            self._results = None  # exhausted
+        if not batch:
+            return
+        first = len(self._headers)
+        self.beginInsertRows(QtCore.QModelIndex(),
+                             first, first + len(batch) - 1)
+        self._headers.extend(batch)
+        self._labels.extend(self._label(row, header)
+                            for row, header in enumerate(batch, start=first))
+        self.endInsertRows()
+
+    def _label(self, row, header):
+        "Return a cached label, or a placeholder while one is computed."
+        uid = header['start']['uid']
+        label = self._label_cache.get(uid)
+        if label is None:
+            label = '{:.8}'.format(uid)
+            # Identify the row in a way that survives later prepends.
+            position = row - self._prepended
+            self._label_executor.submit(self._compute_label,
+                                        self._generation, position, header)
+        return label
+
+    def _compute_label(self, generation, position, header):
+        if generation != self._generation:
+            return  # The results have been replaced; skip the work.
+        try:
+            label = self.result_dispatch(header)
+        except Exception:
+            return  # Leave the placeholder.
+        self._label_ready.emit(generation, position, header['start']['uid'],
+                               label)
+
+    @QtCore.pyqtSlot(int, int, str, object)
+    def _on_label_ready(self, generation, position, uid, label):
+        self._label_cache[uid] = label
+        if generation != self._generation:
+            return
+        row = position + self._prepended
+        self._labels[row] = label
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+
+def _stop_doc(header):
+    try:
+        stop = header['stop']
+    except (KeyError, ValueError):
+        return None
+    return stop or None  # Some versions give {} for a running run.
+
+
+def _columns(headers):
+    "Extract the columns of ResultTableModel from Headers."
+    starts = [h['start'] for h in headers]
+    stops = [_stop_doc(h) for h in headers]
+    nan = float('nan')
+    columns = {
+        'time': np.array([s['time'] for s in starts], dtype=float),
+        'scan_id': np.array([s.get('scan_id', nan) for s in starts],
+                            dtype=float),
+        'plan_name': np.array([str(s.get('plan_name', '')) for s in starts],
+                              dtype=str),
+        'uid': np.array([s['uid'] for s in starts], dtype=str),
+        'duration': np.array([stop['time'] - start['time'] if stop else nan
+                              for start, stop in zip(starts, stops)],
+                             dtype=float),
+        'exit_status': np.array([str(stop.get('exit_status', ''))
+                                 if stop else '' for stop in stops],
+                                dtype=str)}
+    return columns
+
+
+class ResultTableModel(QtCore.QAbstractTableModel):
+    """
+    A table model of results, with one column per summary field.
+
+    The columns are extracted from the Headers once, into numpy arrays, so
+    that sorting and filtering use vectorized operations. Unlike
+    ``ResultListModel``, this retrieves all of the results up front.
+
+    Attributes
+    ----------
+    columns : dict
+        maps each name in ``COLUMNS`` to an array with one entry per result,
+        in the order the results were given (not the displayed order)
+
+    Signals
+    -------
+    fetch_failed(Exception)
+        emitted if pulling from the result iterator raises
+    """
+    COLUMNS = ('time', 'scan_id', 'plan_name', 'uid', 'duration',
+               'exit_status')
+    _STRING_COLUMNS = ('plan_name', 'uid', 'exit_status')
+    fetch_failed = QtCore.pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self._headers = []
+        self.columns = _columns([])
+        self._mask = None
+        self._text_filter = ''  # see set_text_filter
+        self._sort = None
+        self._rows = np.arange(0)  # source index of each displayed row
+
+    def set_results(self, results):
+        """
+        Replace the contents of the model.
+
+        Parameters
+        ----------
+        results : iterable
+            Headers, which will all be retrieved. If this is a
+            ``SearchResults`` with ``columns`` (see ``tabulate``), those are
+            used rather than extracted again on the GUI thread.
+        """
+        try:
+            headers = list(results)
+        except Exception as exc:
+            headers = []
+            self.fetch_failed.emit(exc)
+        columns = getattr(results, 'columns', None)
+        if columns is None or len(columns['uid']) != len(headers):
+            columns = _columns(headers)
+        self.beginResetModel()
+        self._headers = headers
+        self.columns = columns
+        self._mask = self._text_mask(columns, self._text_filter)
+        self._update_rows()
+        self.endResetModel()
+
+    def prepend(self, headers):
+        """
+        Add Headers, as for new runs, keeping the sort, filter and selection.
+
+        Parameters
+        ----------
+        headers : list
+        """
+        if not headers:
+            return
+        new = _columns(headers)
+
+        def change():
+            self._headers = list(headers) + self._headers
+            self.columns = {name: np.concatenate([new[name], col])
+                            for name, col in self.columns.items()}
+            if self._mask is not None:
+                if self._text_filter:
+                    added = self._text_mask(new, self._text_filter)
+                else:
+                    added = np.ones(len(headers), dtype=bool)
+                self._mask = np.concatenate([added, self._mask])
+
+        # The new runs shift the source index of every existing one.
+        self._relayout(change, shift=len(headers))
+
+    def header(self, row):
+        "Return the Header displayed in a given row."
+        return self._headers[self._rows[row]]
+
+    def newest_runs(self):
+        """
+        Return the start time and uids of the newest run(s).
+
+        Returns
+        -------
+        time : float or None
+        uids : list
+        """
+        times = self.columns['time']
+        if not len(times):
+            return None, []
+        newest = times.max()
+        return newest, list(self.columns['uid'][times == newest])
+
+    def set_mask(self, mask):
+        """
+        Show only some results.
+
+        Parameters
+        ----------
+        mask : array or None
+            boolean, aligned with the arrays in ``columns``; None shows all
+        """
+        self._text_filter = ''
+        self._relayout(lambda: setattr(self, '_mask', mask))
+
+    def set_text_filter(self, text):
+        """
+        Show only results with text in any of their string columns.
+
+        The match is case-insensitive. An empty string shows all results.
+        The filter also applies to results set or prepended later.
+        """
+        self.set_mask(self._text_mask(self.columns, text))
+        self._text_filter = text
+
+    def _text_mask(self, columns, text):
+        "Mask the rows of columns with text in a string column, if any text."
+        if not text:
+            return None
+        text = text.lower()
+        mask = np.zeros(len(columns['uid']), dtype=bool)
+        for name in self._STRING_COLUMNS:
+            mask |= np.char.find(np.char.lower(columns[name]), text) >= 0
+        return mask
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if (role == QtCore.Qt.DisplayRole and
+                orientation == QtCore.Qt.Horizontal):
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        name = self.COLUMNS[index.column()]
+        val = self.columns[name][self._rows[index.row()]]
+        if name == 'time':
+            return datetime.fromtimestamp(val).strftime('%Y-%m-%d %H:%M:%S')
+        elif name == 'scan_id':
+            return '' if np.isnan(val) else str(int(val))
+        elif name == 'duration':
+            return '' if np.isnan(val) else '{:.1f} s'.format(val)
+        return str(val)
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        self._relayout(lambda: setattr(self, '_sort', (column, order)))
+
+    def _relayout(self, change, shift=0):
+        """
+        Apply a change to sorting or filtering, preserving the selection.
+
+        shift is added to the source index of each existing result, for
+        changes that insert results before them.
+        """
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        sources = [self._rows[index.row()] + shift for index in old]
+        change()
+        self._update_rows()
+        new_rows = np.full(len(self._headers), -1)
+        new_rows[self._rows] = np.arange(len(self._rows))
+        new = [self.index(int(new_rows[source]), index.column())
+               if new_rows[source] >= 0 else QtCore.QModelIndex()
+               for source, index in zip(sources, old)]
+        self.changePersistentIndexList(old, new)
+        self.layoutChanged.emit()
+
+    def _update_rows(self):
+        if self._mask is None:
+            rows = np.arange(len(self._headers))
+        else:
+            rows = np.flatnonzero(self._mask)
+        if self._sort is not None:
+            column, order = self._sort
+            values = self.columns[self.COLUMNS[column]][rows]
+            rows = rows[np.argsort(values, kind='stable')]
+            if order == QtCore.Qt.DescendingOrder:
+                rows = rows[::-1]
+        self._rows = rows
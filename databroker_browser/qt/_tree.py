@@ -0,0 +1,315 @@
+from bisect import bisect_right
+from collections.abc import Iterable
+from datetime import datetime
+from itertools import islice
+import reprlib
+from matplotlib.backends.qt_compat import QtCore
+
+
+# Lists longer than this show only their first elements in the tree.
+MAX_TREE_CHILDREN = 1000
+
+
+class BoundedRepr(reprlib.Repr):
+    """
+    A repr whose cost is bounded regardless of the size of the object.
+
+    Only the first few items of containers (and a few levels of nesting) are
+    visited, and numpy arrays are summarized by shape and dtype with their
+    first few values, so a repr never builds more than a few KB of text.
+    """
+    def __init__(self):
+        super().__init__()
+        self.maxlevel = 3
+        self.maxtuple = 10
+        self.maxlist = 10
+        self.maxarray = 10
+        self.maxdict = 10
+        self.maxset = 10
+        self.maxfrozenset = 10
+        self.maxdeque = 10
+        self.maxstring = 82
+        self.maxlong = 40
+        self.maxother = 82
+
+    def repr_ndarray(self, x, level):
+        if x.size <= self.maxlist:
+            return repr(x)
+        head = ', '.join(self.repr1(val, level - 1)
+                         for val in x.flat[:self.maxlist].tolist())
+        return 'array([{}, ...], shape={}, dtype={})'.format(head, x.shape,
+                                                             x.dtype)
+
+
+_bounded_repr = BoundedRepr().repr
+
+
+def _listlike(val):
+    return isinstance(val, Iterable) and not isinstance(val, str)
+
+
+def _short_repr(text):
+    r = _bounded_repr(text)
+    if len(r) > 82:
+        r = r[:27] + '...'
+    return r
+
+
+def _tree_entries(value):
+    """
+    Yield the children of a node displaying value, one level deep.
+
+    Each child is described by a tuple ``(text, value, expandable,
+    expanded)``, where ``value`` is what the child's own children are made
+    from and ``expanded`` is whether it should start out expanded.
+    """
+    if hasattr(value, 'items'):
+        for key, val in sorted(value.items()):
+            # val is dict or a list -> a branch
+            if hasattr(val, 'items') or _listlike(val):
+                yield (_short_repr(key).strip("'"), val, True,
+                       key != 'descriptors')
+            # val is not iterable -> show key and val on one line
+            else:
+                # Show human-readable datetime alongside raw timestamp.
+                # 1484948553.567529 > '[2017-01-20 16:42:33] 1484948553.567529'
+                if (key == 'time') and isinstance(val, float):
+                    FMT = '%Y-%m-%d %H:%M:%S'
+                    ts = datetime.fromtimestamp(val).strftime(FMT)
+                    text = "time: [{}] {}".format(ts, val)
+                else:
+                    text = "{}: {}".format(_short_repr(key).strip("'"),
+                                           _short_repr(val))
+                yield text, None, False, False
+    elif type(value) is list:
+        # The contents of nested containers are shown inline.
+        for val in islice(value, MAX_TREE_CHILDREN):
+            if hasattr(val, 'items') or _listlike(val):
+                yield from _tree_entries(val)
+            else:
+                yield _short_repr(val), None, False, False
+        if len(value) > MAX_TREE_CHILDREN:
+            yield ("... ({} more)".format(len(value) - MAX_TREE_CHILDREN),
+                   None, False, False)
+    else:
+        yield _short_repr(value), None, False, False
+
+
+def _paths(value, prefix=''):
+    "Yield (key path, short repr) for every leaf of a nested document."
+    if hasattr(value, 'items'):
+        for key, val in sorted(value.items()):
+            path = '{}.{}'.format(prefix, key) if prefix else str(key)
+            yield from _paths(val, path)
+    elif type(value) is list:
+        for i, val in enumerate(islice(value, MAX_TREE_CHILDREN)):
+            yield from _paths(val, '{}[{}]'.format(prefix, i))
+    else:
+        yield prefix, _short_repr(value)
+
+
+class PathIndex:
+    """
+    A flat index of the leaves of a nested document, for fast filtering.
+
+    Each leaf is a line ``'key.path: value'``. Matching scans one
+    lower-cased string, so filtering tens of thousands of leaves takes
+    milliseconds.
+
+    Parameters
+    ----------
+    document : dict-like
+    """
+    def __init__(self, document):
+        self.lines = ['{}: {}'.format(path, text)
+                      for path, text in _paths(document)]
+        self._haystack = '\n'.join(self.lines).lower()
+        self._starts = []
+        start = 0
+        for line in self.lines:
+            self._starts.append(start)
+            start += len(line) + 1
+
+    def __len__(self):
+        return len(self.lines)
+
+    def search(self, text):
+        """
+        Return the numbers of the lines that contain text, ignoring case.
+        """
+        text = text.lower()
+        if not text:
+            return list(range(len(self.lines)))
+        if '\n' in text:
+            # No line contains one; do not match across lines.
+            return []
+        matches = []
+        haystack = self._haystack
+        pos = haystack.find(text)
+        while pos != -1:
+            line = bisect_right(self._starts, pos) - 1
+            matches.append(line)
+            if line + 1 == len(self._starts):
+                break
+            pos = haystack.find(text, self._starts[line + 1])
+        return matches
+
+
+class PathFilterModel(QtCore.QAbstractListModel):
+    "A list model of the lines of a PathIndex that match a filter."
+    def __init__(self):
+        super().__init__()
+        self._index = None
+        self._matches = []
+
+    def set_filter(self, path_index, text):
+        """
+        Show the lines of path_index that contain text, ignoring case.
+        """
+        self.beginResetModel()
+        self._index = path_index
+        self._matches = path_index.search(text)
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._matches)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        return self._index.lines[self._matches[index.row()]]
+
+
+class _Node:
+    __slots__ = ('parent', 'row', 'text', 'value', 'expandable', 'expanded',
+                 'children')
+
+    def __init__(self, parent, row, text, value, expandable, expanded):
+        self.parent = parent
+        self.row = row
+        self.text = text
+        self.value = value
+        self.expandable = expandable
+        self.expanded = expanded
+        self.children = None  # built on demand
+
+    def build(self):
+        self.children = [_Node(self, row, *entry) for row, entry
+                         in enumerate(_tree_entries(self.value))]
+
+
+class HeaderTreeModel(QtCore.QAbstractItemModel):
+    """
+    A tree model of a nested document, such as a Header.
+
+    Nodes are built only when their parent is expanded, so the cost of
+    showing a document does not depend on how much of it is hidden. The
+    model also records which nodes are expanded (see ``set_expanded``) so
+    that a view can be restored when the model is shown again.
+
+    Parameters
+    ----------
+    document : dict-like, optional
+    """
+    def __init__(self, document=None):
+        super().__init__()
+        self._root = _Node(None, 0, '', {}, True, True)
+        self._root.build()
+        self._path_index = None
+        if document is not None:
+            self.set_document(document)
+
+    def set_document(self, document):
+        "Replace the document displayed."
+        self.beginResetModel()
+        self._root = _Node(None, 0, '', document, True, True)
+        self._root.build()
+        self._path_index = None
+        self.endResetModel()
+
+    def path_index(self):
+        "Return a PathIndex of the document, built on first use."
+        if self._path_index is None:
+            self._path_index = PathIndex(self._root.value)
+        return self._path_index
+
+    def _node(self, index):
+        return index.internalPointer() if index.isValid() else self._root
+
+    def set_expanded(self, index, expanded):
+        """
+        Record whether the node at index is expanded.
+
+        Connect this to a view's ``expanded`` and ``collapsed`` signals so
+        that ``expanded_indexes`` can restore the view's state later.
+        """
+        if index.isValid():
+            index.internalPointer().expanded = expanded
+
+    def expanded_indexes(self):
+        "Yield the indexes of expanded nodes, parents before children."
+        nodes = [node for node in reversed(self._root.children)
+                 if node.expanded]
+        while nodes:
+            node = nodes.pop()
+            yield self.createIndex(node.row, 0, node)
+            if node.children is not None:
+                nodes.extend(child for child in reversed(node.children)
+                             if child.expanded)
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column,
+                                self._node(parent).children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        node = index.internalPointer().parent
+        if node is None or node is self._root:
+            return QtCore.QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        children = self._node(parent).children
+        return 0 if children is None else len(children)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        node = self._node(parent)
+        if node.children is None:
+            return node.expandable
+        return bool(node.children)
+
+    def canFetchMore(self, parent):
+        node = self._node(parent)
+        return node.expandable and node.children is None
+
+    def fetchMore(self, parent):
+        node = self._node(parent)
+        if node.children is not None:
+            return
+        entries = list(_tree_entries(node.value))
+        if not entries:
+            node.children = []
+            return
+        self.beginInsertRows(parent, 0, len(entries) - 1)
+        node.children = [_Node(node, row, *entry)
+                         for row, entry in enumerate(entries)]
+        # Only the top level follows the initial expansion suggested by
+        # _tree_entries. Below it, nodes are expanded by the user.
+        for child in node.children:
+            child.expanded = False
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        return index.internalPointer().text
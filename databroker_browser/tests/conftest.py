@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+
+class FakeHeader(dict):
+    "A Header: the start and stop documents, plus descriptors."
+    def __init__(self, start, stop=None, descriptors=()):
+        super().__init__(start=start, stop=stop or {})
+        self.descriptors = list(descriptors)
+
+
+class FakeBroker:
+    """
+    A Broker holding runs in memory.
+
+    Like the real one, calling it yields matching runs newest first. Events
+    are made up from the descriptors: event i of a stream has the value i
+    for each scalar field, an array of ones times i for each array field,
+    and, unless filled, a reference for each external field.
+    """
+    def __init__(self, headers=(), events=3):
+        self.headers = list(headers)
+        self.events = events
+        self.fail_after = None  # raise after yielding this many runs
+        self.queries = 0  # number of calls and lookups
+
+    def add_run(self, uid, time, stop=True, descriptors=(), **md):
+        start = dict(uid=uid, time=time, **md)
+        header = FakeHeader(start,
+                            {'time': time + 1, 'exit_status': 'success'}
+                            if stop else None,
+                            descriptors)
+        self.headers.append(header)
+        return header
+
+    def __call__(self, start_time=None, **query):
+        self.queries += 1
+        headers = sorted(self.headers, key=lambda h: h['start']['time'],
+                         reverse=True)
+        for i, header in enumerate(headers):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise RuntimeError("lost the connection to the database")
+            start = header['start']
+            if start_time is not None and start['time'] < start_time:
+                continue
+            if all(_matches(start.get(key), val)
+                   for key, val in query.items()):
+                yield header
+
+    def __getitem__(self, key):
+        self.queries += 1
+        if key == -1:
+            return max(self.headers, key=lambda h: h['start']['time'])
+        for header in self.headers:
+            if header['start']['uid'] == key:
+                return header
+        raise KeyError(key)
+
+    def get_events(self, header, stream_name='primary', fields=None,
+                   fill=False):
+        data_keys = {}
+        for descriptor in header.descriptors:
+            if descriptor.get('name', 'primary') == stream_name:
+                data_keys.update(descriptor['data_keys'])
+        if fields is not None:
+            data_keys = {key: val for key, val in data_keys.items()
+                         if key in fields}
+        for i in range(self.events):
+            data = {}
+            for key, data_key in data_keys.items():
+                shape = data_key.get('shape') or []
+                if 'external' in data_key and not fill:
+                    data[key] = 'datum-{}-{}'.format(key, i)
+                elif shape:
+                    data[key] = np.full(shape, i, dtype=float)
+                else:
+                    data[key] = i
+            yield {'seq_num': i + 1, 'time': header['start']['time'] + i,
+                   'data': data}
+
+
+def _matches(value, term):
+    if hasattr(term, 'items'):
+        return value in term['$in']  # the only operator supported
+    return value == term
+
+
+def descriptor(name='primary', **data_keys):
+    return {'name': name, 'data_keys': data_keys}
+
+
+@pytest.fixture
+def db():
+    return FakeBroker()
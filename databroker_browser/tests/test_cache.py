@@ -0,0 +1,33 @@
+import numpy as np
+
+from databroker_browser._cache import LRUCache, approx_sizeof
+
+
+def test_approx_sizeof_counts_arrays():
+    array = np.zeros(1000)
+    assert approx_sizeof({'a': [array]}) > array.nbytes
+
+
+def test_lru_cache_max_entries():
+    cache = LRUCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    cache['a']  # Mark 'a' as used.
+    cache['c'] = 3
+    assert list(cache) == ['a', 'c']
+    assert cache.get('b') is None
+
+
+def test_lru_cache_max_bytes():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache['a'] = 'xxxx'
+    cache['b'] = 'xxxx'
+    assert cache.nbytes == 8
+    cache['c'] = 'xxxx'
+    assert list(cache) == ['b', 'c']
+    assert cache.nbytes == 8
+    # The newest item is kept even if it alone is over budget.
+    cache['d'] = 'x' * 20
+    assert list(cache) == ['d']
+    assert cache.pop('d') == 'x' * 20
+    assert cache.nbytes == 0
@@ -0,0 +1,239 @@
+import csv
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from databroker_browser import _export
+from databroker_browser._export import (
+    stream_names, stream_fields, iter_tables, iter_columns, write_csv,
+    write_parquet, write_arrow, write_hdf5, write_xlsx, export_run,
+    export_runs, image_fields, write_images)
+from .conftest import FakeBroker, descriptor
+
+
+def make_run(db, uid='abc', time=1000):
+    return db.add_run(uid, time, descriptors=[
+        descriptor(x={'dtype': 'number', 'shape': []},
+                   spectrum={'dtype': 'array', 'shape': [600]},
+                   image={'dtype': 'array', 'shape': [512, 512],
+                          'external': 'FILESTORE:'}),
+        descriptor('baseline', temp={'dtype': 'number', 'shape': []})])
+
+
+def test_stream_fields():
+    header = make_run(FakeBroker())
+    assert stream_fields(header, 'primary') == ['image', 'spectrum', 'x']
+    assert stream_fields(header, 'primary', ['x', 'nope']) == ['x']
+
+
+def test_iter_tables_unfilled_by_default():
+    pytest.importorskip('pandas')
+    db = FakeBroker(events=5)
+    header = make_run(db)
+    tables = list(iter_tables(db, header, 'primary', chunk_size=2))
+    assert [len(table) for table in tables] == [2, 2, 1]
+    first = tables[0]
+    assert list(first.columns) == ['time', 'image', 'spectrum', 'x']
+    assert list(first.index) == [1, 2]
+    assert list(first['image']) == ['datum-image-0', 'datum-image-1']
+
+
+def test_filled_chunks_are_sized_by_bytes(monkeypatch):
+    pytest.importorskip('pandas')
+    monkeypatch.setattr(_export, 'CHUNK_BYTES', 3 * 8 * 512 * 512)
+    db = FakeBroker(events=7)
+    header = make_run(db)
+    tables = list(iter_tables(db, header, 'primary', fields=['image'],
+                              fill=True))
+    assert [len(table) for table in tables] == [3, 3, 1]
+    assert tables[0]['image'].iloc[0].shape == (512, 512)
+
+
+def test_write_csv(tmp_path):
+    pytest.importorskip('pandas')
+    db = FakeBroker(events=5)
+    header = make_run(db)
+    fp = str(tmp_path / 'primary.csv')
+    counts = []
+    assert write_csv(db, header, 'primary', fp, chunk_size=2,
+                     progress=counts.append) == 5
+    assert counts == [2, 4, 5]
+    with open(fp, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['seq_num', 'time', 'image', 'spectrum', 'x']
+    assert len(rows) == 6
+    assert rows[2][2] == 'datum-image-1'
+    # Array values are written in full, not abbreviated.
+    assert json.loads(rows[2][3]) == [1.0] * 600
+
+
+def test_write_csv_cancel(tmp_path):
+    pytest.importorskip('pandas')
+    db = FakeBroker()
+    header = make_run(db)
+    cancel = threading.Event()
+    cancel.set()
+    assert write_csv(db, header, 'primary', str(tmp_path / 'a.csv'),
+                     cancel=cancel) == 0
+
+
+def test_stream_names():
+    header = make_run(FakeBroker())
+    assert stream_names(header) == ['primary', 'baseline']
+
+
+def test_iter_columns():
+    db = FakeBroker(events=5)
+    header = make_run(db)
+    chunks = list(iter_columns(db, header, 'primary', chunk_size=2))
+    assert [len(chunk['seq_num']) for chunk in chunks] == [2, 2, 1]
+    first = chunks[0]
+    assert list(first) == ['seq_num', 'time', 'image', 'spectrum', 'x']
+    assert list(first['image']) == ['datum-image-0', 'datum-image-1']
+    assert first['spectrum'].shape == (2, 600)
+    # 'number' fields are floats in every chunk, even when whole.
+    assert first['x'].dtype == float
+
+
+def read_parquet(fp):
+    import pyarrow.parquet as pq
+    return pq.read_table(fp)
+
+
+def read_arrow(fp):
+    import pyarrow as pa
+    return pa.ipc.open_file(fp).read_all()
+
+
+@pytest.mark.parametrize('write, read', [(write_parquet, read_parquet),
+                                         (write_arrow, read_arrow)])
+def test_write_arrow_formats(tmp_path, write, read):
+    pytest.importorskip('pyarrow')
+    db = FakeBroker(events=5)
+    header = make_run(db)
+    fp = str(tmp_path / 'primary')
+    assert write(db, header, 'primary', fp, chunk_size=2) == 5
+    table = read(fp)
+    assert table.column_names == ['seq_num', 'time', 'image', 'spectrum',
+                                  'x']
+    assert table.num_rows == 5
+    field = table.schema.field('spectrum')
+    assert json.loads(field.metadata[b'shape']) == [600]
+    assert table.column('x').to_pylist() == [0, 1, 2, 3, 4]
+
+
+def test_write_hdf5(tmp_path):
+    h5py = pytest.importorskip('h5py')
+    db = FakeBroker(events=5)
+    header = make_run(db)
+    with h5py.File(str(tmp_path / 'run.h5'), 'w') as f:
+        assert write_hdf5(db, header, 'primary', f, chunk_size=2) == 5
+        stream = f['primary']
+        assert stream['spectrum'].shape == (5, 600)
+        assert list(stream['x'][:]) == [0, 1, 2, 3, 4]
+        assert stream['image'][0] == b'datum-image-0'
+
+
+def test_write_xlsx(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    db = FakeBroker(events=5)
+    header = make_run(db)
+    fp = str(tmp_path / 'run.xlsx')
+    assert write_xlsx(db, header, fp, fields={'primary': ['x', 'spectrum']},
+                      max_rows=3) == 10
+    workbook = openpyxl.load_workbook(fp)
+    assert workbook.sheetnames == ['primary', 'primary (2)', 'primary (3)',
+                                   'baseline', 'baseline (2)',
+                                   'baseline (3)']
+    rows = list(workbook['primary'].values)
+    assert rows[0] == ('seq_num', 'time', 'spectrum', 'x')
+    assert json.loads(rows[2][2]) == [1.0] * 600
+
+
+def test_write_xlsx_refuses_values_too_large_for_a_cell(tmp_path):
+    pytest.importorskip('openpyxl')
+    db = FakeBroker()
+    header = make_run(db)
+    with pytest.raises(ValueError, match="'image'"):
+        write_xlsx(db, header, str(tmp_path / 'run.xlsx'),
+                   fields={'primary': ['image']}, fill=True)
+
+
+def test_export_run_resumes(tmp_path):
+    pytest.importorskip('pyarrow')
+    db = FakeBroker()
+    header = make_run(db)
+    dest = str(tmp_path)
+    fp = tmp_path / 'primary' / 'uid=abc' / 'data.parquet'
+    (tmp_path / 'primary' / 'uid=abc').mkdir(parents=True)
+    fp.write_bytes(b'exported before')
+    export_run(db, header, dest)
+    assert fp.read_bytes() == b'exported before'  # skipped
+    assert (tmp_path / 'baseline' / 'uid=abc' / 'data.parquet').exists()
+    assert not list(tmp_path.glob('*/*/*.part'))
+
+
+def test_export_runs_hdf5(tmp_path):
+    h5py = pytest.importorskip('h5py')
+    db = FakeBroker()
+    headers = [make_run(db, 'run{}'.format(i), i) for i in range(3)]
+    fp = str(tmp_path / 'runs.h5')
+    assert export_runs(db, headers, fp, format='hdf5') == {}
+    with h5py.File(fp, 'r') as f:
+        assert sorted(f) == ['run0', 'run1', 'run2']
+        assert sorted(f['run1']) == ['baseline', 'primary']
+        assert f['run1'].attrs['complete']
+        assert json.loads(f['run1'].attrs['start'])['uid'] == 'run1'
+
+
+def test_export_run_bad_format(tmp_path):
+    db = FakeBroker()
+    with pytest.raises(ValueError):
+        export_run(db, make_run(db), str(tmp_path), format='txt')
+
+
+def test_image_fields():
+    header = make_run(FakeBroker())
+    assert image_fields(header) == [('primary', 'image')]
+
+
+@pytest.mark.parametrize('format', ['hdf5', 'zarr'])
+def test_write_images(tmp_path, format):
+    pytest.importorskip({'hdf5': 'h5py', 'zarr': 'zarr'}[format])
+    images = [np.full((6, 4), i) for i in range(5)]
+    fp = str(tmp_path / 'images')
+    counts = []
+    assert write_images(images, fp, format, chunks=(2, 6, 4),
+                        progress=counts.append) == 5
+    assert counts == [2, 4, 5]
+
+
+def test_write_images_errors(tmp_path):
+    pytest.importorskip('h5py')
+    fp = str(tmp_path / 'images.h5')
+    with pytest.raises(ValueError, match='no images'):
+        write_images([], fp)
+    with pytest.raises(ValueError, match='dimensions'):
+        write_images([np.zeros((6, 4))], fp, chunks=(1, 6))
+
+
+def test_requested_fields_missing_from_stream():
+    db = FakeBroker()
+    header = make_run(db)
+    chunk, = iter_columns(db, header, 'baseline', fields=['x'])
+    assert list(chunk) == ['seq_num', 'time']
+
+
+def test_export_run_fields(tmp_path):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    db = FakeBroker()
+    header = make_run(db)
+    export_run(db, header, str(tmp_path), fields={'primary': ['x']})
+    table = pq.read_table(str(tmp_path / 'primary' / 'uid=abc' /
+                              'data.parquet'))
+    assert table.column_names == ['seq_num', 'time', 'x']
+    # Streams left out of fields are not exported.
+    assert not (tmp_path / 'baseline').exists()
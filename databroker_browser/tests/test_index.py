@@ -0,0 +1,152 @@
+import pytest
+
+from databroker_browser._index import MetadataIndex
+from .conftest import FakeBroker
+
+
+def populate(db, n):
+    for i in range(n):
+        db.add_run('uid{:02}'.format(i), 1000 + i, scan_id=i,
+                   plan_name='scan' if i % 2 else 'count',
+                   detectors=['det1', 'det{}'.format(i)],
+                   sample={'name': 'gold' if i < 5 else 'silver'})
+
+
+def test_sync_and_search():
+    db = FakeBroker()
+    populate(db, 10)
+    index = MetadataIndex(db)
+    assert index.last_time is None
+    assert index.sync() == 10
+    assert len(index) == 10
+    assert index.last_time == 1009
+    # newest first
+    assert index.search() == ['uid{:02}'.format(i)
+                              for i in reversed(range(10))]
+    assert index.search(plan_name='count', scan_id=4) == ['uid04']
+    assert index.search(**{'sample.name': 'gold', 'plan_name': 'scan'}) == [
+        'uid03', 'uid01']
+    # A scalar matches any element of a list-valued field.
+    assert index.search(detectors='det3') == ['uid03']
+    assert len(index.search(detectors='det1')) == 10
+    assert index.search(start_time=1007) == ['uid09', 'uid08', 'uid07']
+    assert index.search(start_time=1002, stop_time=1004) == ['uid03', 'uid02']
+    assert index.search(text='silver', plan_name='scan') == [
+        'uid09', 'uid07', 'uid05']
+    assert index.search(text='det7') == ['uid07']
+    assert [h['start']['uid'] for h in index(scan_id=2)] == ['uid02']
+
+
+def test_whole_number_floats_match_integers():
+    db = FakeBroker()
+    db.add_run('a', 1, scan_id=20, exposure=0.5)
+    index = MetadataIndex(db)
+    index.sync()
+    assert index.search(scan_id=20.0) == ['a']
+    assert index.search(scan_id=20) == ['a']
+    assert index.search(exposure=0.5) == ['a']
+    assert index.search(scan_id=True) == []
+
+
+def test_incremental_sync():
+    db = FakeBroker()
+    populate(db, 5)
+    index = MetadataIndex(db)
+    index.sync()
+    db.add_run('new', 2000, plan_name='scan')
+    # Runs starting at last_time are asked for again, but not duplicated.
+    assert index.sync() == 2
+    assert len(index) == 6
+    assert index.last_time == 2000
+    assert index.search(start_time=1500) == ['new']
+
+
+def test_interrupted_sync_is_redone():
+    db = FakeBroker()
+    populate(db, 25)
+    index = MetadataIndex(db)
+    # The Broker yields newest first; lose the connection part way.
+    db.fail_after = 15
+    with pytest.raises(RuntimeError):
+        index.sync(batch_size=10)
+    assert len(index) == 10  # the first batch was committed
+    assert index.last_time is None  # but the pass did not finish
+    db.fail_after = None
+    index.sync(batch_size=10)
+    assert len(index) == 25
+    assert index.last_time == 1024
+
+
+def test_unfinished_runs_are_rechecked():
+    db = FakeBroker()
+    running = db.add_run('running', 1000, stop=False)
+    index = MetadataIndex(db)
+    index.sync()
+    assert index.search(**{'stop.exit_status': 'success'}) == []
+    running['stop'] = {'time': 1001, 'exit_status': 'success'}
+    db.add_run('later', 1010)
+    index.sync()
+    assert index.search(**{'stop.exit_status': 'success'}) == [
+        'later', 'running']
+
+
+def test_persistence(tmp_path):
+    db = FakeBroker()
+    populate(db, 3)
+    path = str(tmp_path / 'runs.sqlite')
+    index = MetadataIndex(db, path)
+    index.sync()
+    index.close()
+    index = MetadataIndex(db, path)
+    assert len(index) == 3
+    assert index.last_time == 1002
+
+
+@pytest.mark.parametrize('query, supported', [
+    ({'plan_name': 'scan'}, True),
+    ({'start_time': 10, 'text': 'gold'}, True),
+    ({'start_time': '2017-01-01'}, False),
+    ({'data_key': 'det'}, False),
+    ({'since': '2017-01-01'}, False),
+    ({'until': '2018-01-01'}, False),
+    ({'$or': [{'a': 1}, {'b': 2}]}, False),
+    ({'scan_id': {'$gt': 5}}, False),
+    ({'detectors': ['det1', 'det2']}, False)])
+def test_supports(query, supported):
+    assert MetadataIndex.supports(query) == supported
+
+
+def test_unsupported_query_raises():
+    index = MetadataIndex(FakeBroker())
+    with pytest.raises(ValueError):
+        index.search(scan_id={'$gt': 5})
+
+
+def test_headers_are_looked_up_in_batches():
+    db = FakeBroker()
+    populate(db, 25)
+    index = MetadataIndex(db, lookup_size=10)
+    index.sync()
+    del db.headers[3]  # uid03, since removed from db
+    db.queries = 0
+    uids = [h['start']['uid'] for h in index()]
+    assert uids == ['uid{:02}'.format(i) for i in reversed(range(25))
+                    if i != 3]
+    assert db.queries == 3
+
+
+class NoInBroker(FakeBroker):
+    "A Broker that cannot answer $in queries."
+    def __call__(self, **query):
+        if 'uid' in query:
+            raise TypeError("unsupported query")
+        return super().__call__(**query)
+
+
+def test_headers_are_looked_up_one_by_one_as_a_fallback():
+    db = NoInBroker()
+    populate(db, 5)
+    index = MetadataIndex(db)
+    index.sync()
+    assert [h['start']['uid'] for h in index(plan_name='scan')] == [
+        'uid03', 'uid01']
@@ -0,0 +1,105 @@
+import pytest
+
+pytest.importorskip('matplotlib.backends.qt_compat')
+
+import numpy as np  # noqa: E402
+
+from databroker_browser.qt._search import (  # noqa: E402
+    normalize_query, is_refinement, header_matches, tabulate,
+    ResultTableModel)
+
+
+def test_normalize_query_ignores_key_order():
+    assert (normalize_query({'a': 1, 'b': {'c': [1, 2], 'd': 'x'}}) ==
+            normalize_query({'b': {'d': 'x', 'c': [1, 2]}, 'a': 1}))
+    assert normalize_query({'a': 1}) != normalize_query({'a': 2})
+
+
+def test_normalize_query_is_hashable():
+    key = normalize_query({'a': [1, {'b': 2}], 'c': {3, 4}})
+    assert {key: True}[key]
+
+
+@pytest.mark.parametrize('query, base, expected', [
+    ({'plan_name': 'scan', 'scan_id': 3}, {'plan_name': 'scan'}, True),
+    ({'plan_name': 'scan', 'sample.name': 'gold'}, {'plan_name': 'scan'},
+     True),
+    ({'scan_id': 3}, {}, True),
+    # no added terms
+    ({'plan_name': 'scan'}, {'plan_name': 'scan'}, False),
+    # a changed term
+    ({'plan_name': 'count', 'scan_id': 3}, {'plan_name': 'scan'}, False),
+    # a dropped term
+    ({'scan_id': 3}, {'plan_name': 'scan', 'scan_id': 3}, False),
+    # terms the Broker interprets itself
+    ({'plan_name': 'scan', 'since': '2017'}, {'plan_name': 'scan'}, False),
+    ({'plan_name': 'scan', 'until': '2018'}, {'plan_name': 'scan'}, False),
+    ({'plan_name': 'scan', 'start_time': 0}, {'plan_name': 'scan'}, False),
+    ({'plan_name': 'scan', 'text': 'gold'}, {'plan_name': 'scan'}, False),
+    ({'plan_name': 'scan', 'data_key': 'det'}, {'plan_name': 'scan'},
+     False),
+    ({'plan_name': 'scan', '$or': [{'a': 1}]}, {'plan_name': 'scan'}, False),
+    # terms on the stop document
+    ({'plan_name': 'scan', 'stop.exit_status': 'success'},
+     {'plan_name': 'scan'}, False),
+    # terms that are not equality tests on a scalar
+    ({'plan_name': 'scan', 'scan_id': {'$gt': 3}}, {'plan_name': 'scan'},
+     False),
+    ({'plan_name': 'scan', 'detectors': ['det1']}, {'plan_name': 'scan'},
+     False)])
+def test_is_refinement(query, base, expected):
+    assert is_refinement(query, base) == expected
+
+
+def test_header_matches():
+    header = {'start': {'plan_name': 'scan', 'scan_id': 20,
+                        'detectors': ['det1', 'det2'],
+                        'sample': {'name': 'gold'}}}
+    assert header_matches(header, {})
+    assert header_matches(header, {'plan_name': 'scan', 'scan_id': 20})
+    assert header_matches(header, {'scan_id': 20.0})
+    assert not header_matches(header, {'plan_name': 'count'})
+    # dotted keys address nested fields
+    assert header_matches(header, {'sample.name': 'gold'})
+    assert not header_matches(header, {'sample.name.first': 'gold'})
+    assert not header_matches(header, {'sample.mass': 1})
+    # a scalar matches any element of a list-valued field
+    assert header_matches(header, {'detectors': 'det2'})
+    assert not header_matches(header, {'detectors': 'det3'})
+    assert not header_matches(header, {'missing': None})
+
+
+def run(i, plan_name='scan', stop=True):
+    return {'start': {'uid': 'uid{}'.format(i), 'time': 1000 + i,
+                      'scan_id': i, 'plan_name': plan_name},
+            'stop': ({'time': 1010 + i, 'exit_status': 'success'}
+                     if stop else {})}
+
+
+def test_tabulate():
+    results = tabulate([run(1), run(2, 'count', stop=False)])
+    assert results.complete
+    assert [h['start']['uid'] for h in results.headers] == ['uid1', 'uid2']
+    columns = results.columns
+    assert list(columns['uid']) == ['uid1', 'uid2']
+    assert list(columns['plan_name']) == ['scan', 'count']
+    assert list(columns['scan_id']) == [1, 2]
+    assert columns['duration'][0] == 10
+    assert np.isnan(columns['duration'][1])  # still running
+    assert list(columns['exit_status']) == ['success', '']
+
+
+def test_table_text_filter_applies_to_prepended_runs():
+    model = ResultTableModel()
+    model.set_results(tabulate([run(1), run(2, 'count'), run(3)]))
+    model.set_text_filter('SCAN')
+    assert model.rowCount() == 2
+    model.prepend([run(4, 'count'), run(5)])
+    assert model.rowCount() == 3
+    assert {model.header(row)['start']['uid'] for row in range(3)} == {
+        'uid1', 'uid3', 'uid5'}
+    # ... and to new results.
+    model.set_results(tabulate([run(6), run(7, 'count')]))
+    assert model.rowCount() == 1
+    model.set_text_filter('')
+    assert model.rowCount() == 2
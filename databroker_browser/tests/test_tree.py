@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+pytest.importorskip('matplotlib.backends.qt_compat')
+
+from databroker_browser.qt._tree import (  # noqa: E402
+    MAX_TREE_CHILDREN, BoundedRepr, PathIndex, _short_repr, _tree_entries)
+
+
+def test_tree_entries_of_a_dict():
+    doc = {'uid': 'abc', 'detectors': ['det1', 'det2'],
+           'descriptors': [{}], 'sample': {'name': 'gold'}}
+    assert list(_tree_entries(doc)) == [
+        ('descriptors', [{}], True, False),  # starts out collapsed
+        ('detectors', ['det1', 'det2'], True, True),
+        ('sample', {'name': 'gold'}, True, True),
+        ("uid: 'abc'", None, False, False)]
+
+
+def test_tree_entries_show_time_as_a_date():
+    (text, *_), = _tree_entries({'time': 1484948553.5})
+    date = datetime.fromtimestamp(1484948553.5)
+    assert text == 'time: [{:%Y-%m-%d %H:%M:%S}] 1484948553.5'.format(date)
+    # Only float times are dates.
+    assert list(_tree_entries({'time': 'now'})) == [
+        ("time: 'now'", None, False, False)]
+
+
+def test_tree_entries_of_a_list_are_inline():
+    assert [text for text, *_ in _tree_entries([1, 'a', {'b': 2}])] == [
+        '1', "'a'", 'b: 2']
+
+
+def test_bounded_repr_summarizes_large_arrays():
+    r = BoundedRepr().repr(np.zeros((1000, 1000)))
+    assert r == ('array([{}, ...], shape=(1000, 1000), dtype=float64)'
+                 .format(', '.join(['0.0'] * 10)))
+    # Small arrays are shown in full.
+    assert BoundedRepr().repr(np.arange(3)) == 'array([0, 1, 2])'
+
+
+def test_short_repr_truncates():
+    assert len(_short_repr('a' * 200)) <= 82
+    # Reprs still longer than a line are cut short.
+    assert _short_repr(['a' * 50] * 5) == "['{}...".format('a' * 25)
+    assert len(_short_repr(list(range(10 ** 6)))) < 100
+
+
+def test_tree_entries_of_a_long_list_are_capped():
+    entries = list(_tree_entries(list(range(MAX_TREE_CHILDREN + 5))))
+    assert len(entries) == MAX_TREE_CHILDREN + 1
+    assert entries[-1] == ('... (5 more)', None, False, False)
+
+
+def test_path_index_search():
+    index = PathIndex({'uid': 'abc', 'sample': {'name': 'Gold'},
+                       'detectors': ['det1', 'det2']})
+    assert index.lines == ["detectors[0]: 'det1'", "detectors[1]: 'det2'",
+                           "sample.name: 'Gold'", "uid: 'abc'"]
+    assert index.search('GOLD') == [2]
+    assert index.search('det') == [0, 1]
+    # Each line is reported once, however often it matches.
+    assert index.search('e') == [0, 1, 2]
+    assert index.search('nope') == []
+    assert index.search('') == [0, 1, 2, 3]
+    # Matches do not run across lines.
+    assert index.search("'\nsample") == []
@@ -7,6 +7,7 @@ setup(name='databroker-browser',
       version=versioneer.get_version(),
       cmdclass=versioneer.get_cmdclass(),
       packages=['databroker_browser',
-                'databroker_browser.qt'],
+                'databroker_browser.qt',
+                'databroker_browser.tests'],
       install_requires=['matplotlib', 'six', 'numpy'],
      )